@@ -1,50 +1,35 @@
 import os
 import sys
 import io
-import re
 import atexit
 import threading
 import time
-from collections import deque
-from pathlib import Path
-from flask import Flask, request, jsonify, render_template_string, send_file, send_from_directory
+import metrics
+from flask import Flask, Response, g, request, jsonify, render_template_string, send_file, send_from_directory, stream_with_context
 
-from settings_manager import SettingsManager
-from handy_controller import HandyController
 from llm_service import LLMService
-from audio_service import AudioService
-from background_modes import AutoModeThread, auto_mode_logic, milking_mode_logic, edging_mode_logic
+from background_modes import auto_mode_logic, milking_mode_logic, edging_mode_logic, pattern_playback_logic
+from event_stream import format_event
+from tts_cache import TTSCache
+from intent_router import IntentRouter, plan_fast_move
+from warmup import Readiness
+from session import SessionManager, STOP_MESSAGE, AUTO_INTRO, EDGING_INTRO, MILKING_INTRO, PLAYBACK_INTRO
 
 # ─── INITIALIZATION ───────────────────────────────────────────────────────────────────────────────────
 app = Flask(__name__)
-LLM_URL = "http://127.0.0.1:11434/api/chat"
-settings = SettingsManager(settings_file_path="my_settings.json")
-settings.load()
-
-handy = HandyController(settings.handy_key)
-handy.update_settings(settings.min_speed, settings.max_speed, settings.min_depth, settings.max_depth)
+LLM_URL = os.environ.get("STROKEGPT_LLM_URL", "http://127.0.0.1:11434/api/chat")
+SESSION_COOKIE = "strokegpt_session"
 
+# One Ollama and one voice cache are shared; everything else lives on the per-browser Session.
 llm = LLMService(url=LLM_URL)
-audio = AudioService()
-if settings.elevenlabs_api_key:
-    if audio.set_api_key(settings.elevenlabs_api_key):
-        audio.fetch_available_voices()
-        audio.configure_voice(settings.elevenlabs_voice_id, True)
-
-# In-Memory State
-chat_history = deque(maxlen=20)
-messages_for_ui = deque()
-auto_mode_active_task = None
-current_mood = "Curious"
-use_long_term_memory = True
-calibration_pos_mm = 0.0
-user_signal_event = threading.Event()
-mode_message_queue = deque(maxlen=5)
-edging_start_time = None
-
-# Easter Egg State
-special_persona_mode = None
-special_persona_interactions_left = 0
+readiness = Readiness()
+sessions = SessionManager(llm, default_settings_path="my_settings.json", tts_cache=TTSCache("tts_cache"), readiness=readiness)
+readiness.on_change = lambda: [s.publish_readiness() for s in sessions.all_sessions()]
+# Nothing slow happens before the server is up: the model loads and the voice list comes in the background.
+readiness.run("ollama", llm.preload)
+sessions.start_default()
+metrics.gauge_callback("llm_queued_requests", "Requests waiting for Ollama",
+                       lambda: [({"priority": name}, count) for name, count in llm.scheduler.stats()["queued"].items()])
 
 SNAKE_ASCII = """
 ⣿⣿⣿⣿⣿⣿⣿⣿⣿⣿⣿⠿⠟⠛⠛⠋⠉⠛⠟⢿⣿⣿⣿⣿⣿⣿⣿⣿⣿⣿
@@ -68,72 +53,33 @@ AUTO_ON_WORDS = {"take over", "you drive", "auto mode"}
 AUTO_OFF_WORDS = {"manual", "my turn", "stop auto"}
 MILKING_CUES = {"i'm close", "make me cum", "finish me"}
 EDGING_CUES = {"edge me", "start edging", "tease and deny"}
+PLAYBACK_CUES = {"play my favorites", "play my favourites", "my favorite moves", "my favourite moves"}
+KONAMI_CODE = "up up down down left right left right b a"
+command_router = IntentRouter([
+    ("stop", STOP_COMMANDS, 0), ("konami", {KONAMI_CODE}, 1),
+    ("auto_on", AUTO_ON_WORDS, 2), ("auto_off", AUTO_OFF_WORDS, 3),
+    ("edging", EDGING_CUES, 4), ("milking", MILKING_CUES, 5),
+    ("playback", PLAYBACK_CUES, 6),
+])
 
 # ─── HELPER FUNCTIONS ─────────────────────────────────────────────────────────────────────────────────
 
-def get_current_context():
-    global edging_start_time, special_persona_mode
-    context = {
-        'persona_desc': settings.persona_desc, 'current_mood': current_mood,
-        'user_profile': settings.user_profile, 'patterns': settings.patterns,
-        'rules': settings.rules, 'last_stroke_speed': handy.last_relative_speed,
-        'last_depth_pos': handy.last_depth_pos, 'use_long_term_memory': use_long_term_memory,
-        'edging_elapsed_time': None, 'special_persona_mode': special_persona_mode
-    }
-    if edging_start_time:
-        elapsed_seconds = int(time.time() - edging_start_time)
-        minutes, seconds = divmod(elapsed_seconds, 60)
-        hours, minutes = divmod(minutes, 60)
-        if hours > 0:
-            context['edging_elapsed_time'] = f"{hours}h {minutes}m {seconds}s"
-        else:
-            context['edging_elapsed_time'] = f"{minutes}m {seconds}s"
-    return context
-
-def add_message_to_queue(text, add_to_history=True):
-    messages_for_ui.append(text)
-    if add_to_history:
-        clean_text = re.sub(r'<[^>]+>', '', text).strip()
-        if clean_text: chat_history.append({"role": "assistant", "content": clean_text})
-    threading.Thread(target=audio.generate_audio_for_text, args=(text,)).start()
-
-def start_background_mode(mode_logic, initial_message, mode_name):
-    global auto_mode_active_task, edging_start_time
-    if auto_mode_active_task:
-        auto_mode_active_task.stop()
-        auto_mode_active_task.join(timeout=5)
-    
-    user_signal_event.clear()
-    mode_message_queue.clear()
-    if mode_name == 'edging':
-        edging_start_time = time.time()
-    
-    def on_stop():
-        global auto_mode_active_task, edging_start_time
-        auto_mode_active_task = None
-        edging_start_time = None
-
-    def update_mood(m): global current_mood; current_mood = m
-    def get_timings(n):
-        return {
-            'auto': (settings.auto_min_time, settings.auto_max_time),
-            'milking': (settings.milking_min_time, settings.milking_max_time),
-            'edging': (settings.edging_min_time, settings.edging_max_time)
-        }.get(n, (3, 5))
-
-    services = {'llm': llm, 'handy': handy}
-    callbacks = {
-        'send_message': add_message_to_queue, 'get_context': get_current_context,
-        'get_timings': get_timings, 'on_stop': on_stop, 'update_mood': update_mood,
-        'user_signal_event': user_signal_event,
-        'message_queue': mode_message_queue
-    }
-    auto_mode_active_task = AutoModeThread(mode_logic, initial_message, services, callbacks, mode_name=mode_name)
-    auto_mode_active_task.start()
+def current_session():
+    if 'session' not in g:
+        g.session, g.new_session_id = sessions.resolve(request.cookies.get(SESSION_COOKIE))
+    return g.session
+
+@app.after_request
+def remember_session(response):
+    if new_id := g.get('new_session_id'):
+        response.set_cookie(SESSION_COOKIE, new_id, max_age=60 * 60 * 24 * 365, httponly=True, samesite='Lax')
+    return response
 
 # ─── FLASK ROUTES ──────────────────────────────────────────────────────────────────────────────────────
 @app.route('/')
 def home_page():
+    # Sets the session cookie with the page itself, before its scripts open /events and /check_settings side by side.
+    current_session()
     base_path = sys._MEIPASS if getattr(sys, 'frozen', False) else os.path.dirname(os.path.abspath(__file__))
     with open(os.path.join(base_path, 'index.html'), 'r', encoding='utf-8') as f:
         return render_template_string(f.read())
@@ -142,41 +88,76 @@ def home_page():
 def send_static(path):
     return send_from_directory('static', path)
 
-def _konami_code_action():
+def _konami_code_action(s):
     def pattern_thread():
-        handy.move(speed=100, depth=50, stroke_range=100)
+        s.handy.move(speed=100, depth=50, stroke_range=100)
         time.sleep(5)
-        handy.stop()
+        s.handy.stop()
     threading.Thread(target=pattern_thread).start()
     message = f"Kept you waiting, huh?<pre>{SNAKE_ASCII}</pre>"
-    add_message_to_queue(message)
-
-def _handle_chat_commands(text):
-    if any(cmd in text for cmd in STOP_COMMANDS):
-        if auto_mode_active_task: auto_mode_active_task.stop()
-        handy.stop()
-        add_message_to_queue("Stopping.", add_to_history=False)
-        return True, jsonify({"status": "stopped"})
-    if "up up down down left right left right b a" in text:
-        _konami_code_action()
-        return True, jsonify({"status": "konami_code_activated"})
-    if any(cmd in text for cmd in AUTO_ON_WORDS) and not auto_mode_active_task:
-        start_background_mode(auto_mode_logic, "Okay, I'll take over...", mode_name='auto')
-        return True, jsonify({"status": "auto_started"})
-    if any(cmd in text for cmd in AUTO_OFF_WORDS) and auto_mode_active_task:
-        auto_mode_active_task.stop()
-        return True, jsonify({"status": "auto_stopped"})
-    if any(cmd in text for cmd in EDGING_CUES):
-        start_background_mode(edging_mode_logic, "Let's play an edging game...", mode_name='edging')
-        return True, jsonify({"status": "edging_started"})
-    if any(cmd in text for cmd in MILKING_CUES):
-        start_background_mode(milking_mode_logic, "You're so close... I'm taking over completely now.", mode_name='milking')
-        return True, jsonify({"status": "milking_started"})
+    s.add_message_to_queue(message)
+
+def _handle_chat_commands(s, text):
+    for intent in command_router.match(text):
+        if intent == "stop":
+            s.stop_background_mode()
+            s.cancel_pending_requests()
+            s.handy.stop()
+            s.add_message_to_queue(STOP_MESSAGE, add_to_history=False)
+            return True, jsonify({"status": "stopped"})
+        if intent == "konami":
+            _konami_code_action(s)
+            return True, jsonify({"status": "konami_code_activated"})
+        if intent == "auto_on" and not s.auto_mode_active_task:
+            s.start_background_mode(auto_mode_logic, AUTO_INTRO, mode_name='auto')
+            return True, jsonify({"status": "auto_started"})
+        if intent == "auto_off" and s.auto_mode_active_task:
+            s.stop_background_mode()
+            return True, jsonify({"status": "auto_stopped"})
+        if intent == "edging":
+            s.start_background_mode(edging_mode_logic, EDGING_INTRO, mode_name='edging')
+            return True, jsonify({"status": "edging_started"})
+        if intent == "milking":
+            s.start_background_mode(milking_mode_logic, MILKING_INTRO, mode_name='milking')
+            return True, jsonify({"status": "milking_started"})
+        if intent == "playback":
+            s.start_background_mode(pattern_playback_logic, PLAYBACK_INTRO, mode_name='playback')
+            return True, jsonify({"status": "playback_started"})
     return False, None
 
+def _reply_with_llm(s, applied_move=None):
+    handy = s.handy
+    context = s.get_current_context()
+    # Streamed so the device starts moving as soon as the "move" object is out, while the chat text is still generating.
+    delivered = set()
+    def on_move(move):
+        delivered.add("move")
+        if not applied_move and not s.auto_mode_active_task:
+            handy.move(move.get("sp"), move.get("dp"), move.get("rng"))
+    def on_chat(chat_text):
+        delivered.add("chat")
+        s.add_message_to_queue(chat_text)
+    if applied_move:
+        context['applied_move'] = applied_move
+        delivered.add("move")  # already done, the reply is only for the chat text
+    with metrics.trace_turn("chat (fast move)" if applied_move else "chat"):
+        llm_response = llm.get_chat_response(s.chat_history, context, on_move=on_move, on_chat=on_chat, cancel_group=s.session_id)
+    
+    if s.special_persona_mode is not None:
+        s.special_persona_interactions_left -= 1
+        if s.special_persona_interactions_left <= 0:
+            s.special_persona_mode = None
+            s.add_message_to_queue("(Personality core reverted to standard operation.)", add_to_history=False)
+
+    if "chat" not in delivered and (chat_text := llm_response.get("chat")): s.add_message_to_queue(chat_text)
+    if new_mood := llm_response.get("new_mood"): s.set_mood(new_mood)
+    if "move" not in delivered and not s.auto_mode_active_task and (move := llm_response.get("move")):
+        handy.move(move.get("sp"), move.get("dp"), move.get("rng"))
+
 @app.route('/send_message', methods=['POST'])
 def handle_user_message():
-    global special_persona_mode, special_persona_interactions_left
+    s = current_session()
+    settings, handy = s.settings, s.handy
     data = request.json
     user_input = data.get('message', '').strip()
 
@@ -188,65 +169,71 @@ def handle_user_message():
     if not handy.handy_key: return jsonify({"status": "no_key_set"})
     if not user_input: return jsonify({"status": "empty_message"})
 
-    chat_history.append({"role": "user", "content": user_input})
+    s.add_to_history("user", user_input)
     
-    handled, response = _handle_chat_commands(user_input.lower())
+    handled, response = _handle_chat_commands(s, user_input.lower())
     if handled: return response
 
-    if auto_mode_active_task:
-        mode_message_queue.append(user_input)
-        return jsonify({"status": "message_relayed_to_active_mode"})
-    
-    llm_response = llm.get_chat_response(chat_history, get_current_context())
+    if s.auto_mode_active_task:
+        # Playback has no LLM of its own: it only takes movement commands, anything else gets an ordinary reply.
+        if s.auto_mode_active_task.name != 'playback' or plan_fast_move(user_input, handy.last_relative_speed, handy.last_depth_pos, handy.last_stroke_range)[0]:
+            s.mode_message_queue.append(user_input)
+            return jsonify({"status": "message_relayed_to_active_mode"})
+        _reply_with_llm(s)
+        return jsonify({"status": "ok"})
     
-    if special_persona_mode is not None:
-        special_persona_interactions_left -= 1
-        if special_persona_interactions_left <= 0:
-            special_persona_mode = None
-            add_message_to_queue("(Personality core reverted to standard operation.)", add_to_history=False)
-
-    if chat_text := llm_response.get("chat"): add_message_to_queue(chat_text)
-    if new_mood := llm_response.get("new_mood"): global current_mood; current_mood = new_mood
-    if not auto_mode_active_task and (move := llm_response.get("move")):
-        handy.move(move.get("sp"), move.get("dp"), move.get("rng"))
+    # Plain movement commands ("faster", "go deeper") follow fixed rules, so the Handy reacts right away
+    # and the LLM only has to come up with something to say, in the background.
+    if s.special_persona_mode is None:
+        fast_move, _ = plan_fast_move(user_input, handy.last_relative_speed, handy.last_depth_pos, handy.last_stroke_range)
+        if fast_move:
+            handy.move(fast_move["sp"], fast_move["dp"], fast_move["rng"])
+            threading.Thread(target=_reply_with_llm, args=(s, fast_move), daemon=True).start()
+            return jsonify({"status": "ok"})
+
+    _reply_with_llm(s)
     return jsonify({"status": "ok"})
 
 @app.route('/check_settings')
 def check_settings_route():
+    settings = current_session().settings
     if settings.handy_key and settings.min_depth < settings.max_depth:
         return jsonify({
             "configured": True, "persona": settings.persona_desc, "handy_key": settings.handy_key,
             "ai_name": settings.ai_name, "elevenlabs_key": settings.elevenlabs_api_key,
-            "pfp": settings.profile_picture_b64,
+            "pfp": settings.profile_picture_b64, "position_telemetry": settings.position_telemetry,
+            "smooth_transitions": settings.smooth_transitions,
             "timings": { "auto_min": settings.auto_min_time, "auto_max": settings.auto_max_time, "milking_min": settings.milking_min_time, "milking_max": settings.milking_max_time, "edging_min": settings.edging_min_time, "edging_max": settings.edging_max_time }
         })
     return jsonify({"configured": False})
 
 @app.route('/set_ai_name', methods=['POST'])
 def set_ai_name_route():
-    global special_persona_mode, special_persona_interactions_left
+    s = current_session()
     name = request.json.get('name', 'BOT').strip();
     if not name: name = 'BOT'
     
     if name.lower() == 'glados':
-        special_persona_mode = "GLaDOS"
-        special_persona_interactions_left = 5
-        settings.ai_name = "GLaDOS"
-        settings.save()
+        s.special_persona_mode = "GLaDOS"
+        s.special_persona_interactions_left = 5
+        s.settings.ai_name = "GLaDOS"
+        s.settings.save()
         return jsonify({"status": "special_persona_activated", "persona": "GLaDOS", "message": "Oh, it's *you*."})
 
-    settings.ai_name = name; settings.save()
+    s.settings.ai_name = name; s.settings.save()
     return jsonify({"status": "success", "name": name})
 
 @app.route('/signal_edge', methods=['POST'])
 def signal_edge_route():
-    if auto_mode_active_task and auto_mode_active_task.name == 'edging':
-        user_signal_event.set()
+    s = current_session()
+    if s.auto_mode_active_task and s.auto_mode_active_task.name == 'edging':
+        s.user_signal_event.set()
         return jsonify({"status": "signaled"})
     return jsonify({"status": "ignored", "message": "Edging mode not active."}), 400
 
 @app.route('/set_profile_picture', methods=['POST'])
 def set_pfp_route():
+    settings = current_session().settings
     b64_data = request.json.get('pfp_b64')
     if not b64_data: return jsonify({"status": "error", "message": "Missing image data"}), 400
     settings.profile_picture_b64 = b64_data; settings.save()
@@ -254,92 +241,199 @@ def set_pfp_route():
 
 @app.route('/set_handy_key', methods=['POST'])
 def set_handy_key_route():
+    s = current_session()
     key = request.json.get('key')
     if not key: return jsonify({"status": "error", "message": "Key is missing"}), 400
-    handy.set_api_key(key); settings.handy_key = key; settings.save()
+    s.handy.set_api_key(key); s.settings.handy_key = key; s.settings.save()
     return jsonify({"status": "success"})
 
 @app.route('/nudge', methods=['POST'])
 def nudge_route():
-    global calibration_pos_mm
-    if calibration_pos_mm == 0.0 and (pos := handy.get_position_mm()):
-        calibration_pos_mm = pos
+    s = current_session()
+    if s.calibration_pos_mm == 0.0 and (pos := s.current_position_mm()):
+        s.calibration_pos_mm = pos
     direction = request.json.get('direction')
-    calibration_pos_mm = handy.nudge(direction, 0, 100, calibration_pos_mm)
-    return jsonify({"status": "ok", "depth_percent": handy.mm_to_percent(calibration_pos_mm)})
+    s.calibration_pos_mm = s.handy.nudge(direction, 0, 100, s.calibration_pos_mm)
+    return jsonify({"status": "ok", "depth_percent": s.handy.mm_to_percent(s.calibration_pos_mm)})
+
+@app.route('/set_position_telemetry', methods=['POST'])
+def set_position_telemetry_route():
+    s = current_session()
+    s.set_position_telemetry(bool(request.json.get('enabled')))
+    return jsonify({"status": "success", "enabled": s.settings.position_telemetry})
+
+@app.route('/set_smooth_transitions', methods=['POST'])
+def set_smooth_transitions_route():
+    s = current_session()
+    s.set_smooth_transitions(bool(request.json.get('enabled')))
+    return jsonify({"status": "success", "enabled": s.settings.smooth_transitions})
 
 @app.route('/setup_elevenlabs', methods=['POST'])
 def elevenlabs_setup_route():
+    s = current_session()
     api_key = request.json.get('api_key')
-    if not api_key or not audio.set_api_key(api_key): return jsonify({"status": "error"}), 400
-    settings.elevenlabs_api_key = api_key; settings.save()
-    return jsonify(audio.fetch_available_voices())
+    if not api_key: return jsonify({"status": "error"}), 400
+    # The page sends the saved key again on every load; if the background start-up already listed the voices, reuse them.
+    if api_key == s.settings.elevenlabs_api_key and s.audio.client and s.audio.available_voices:
+        return jsonify({"status": "success", "voices": s.audio.available_voices})
+    if not s.audio.set_api_key(api_key): return jsonify({"status": "error"}), 400
+    s.settings.elevenlabs_api_key = api_key; s.settings.save()
+    result = s.audio.fetch_available_voices()
+    if result["status"] == "success": s.readiness.forget("voice")
+    return jsonify(result)
 
 @app.route('/set_elevenlabs_voice', methods=['POST'])
 def set_elevenlabs_voice_route():
+    s = current_session()
     voice_id, enabled = request.json.get('voice_id'), request.json.get('enabled', False)
-    ok, message = audio.configure_voice(voice_id, enabled)
-    if ok: settings.elevenlabs_voice_id = voice_id; settings.save()
+    ok, message = s.audio.configure_voice(voice_id, enabled)
+    if ok: s.settings.elevenlabs_voice_id = voice_id; s.settings.save()
     return jsonify({"status": "ok" if ok else "error", "message": message})
 
+@app.route('/readiness')
+def readiness_route():
+    return jsonify(current_session().get_readiness())
+
+@app.route('/retry_warmup', methods=['POST'])
+def retry_warmup_route():
+    s = current_session()
+    readiness.retry_failed()
+    s.readiness.retry_failed()
+    return jsonify(s.get_readiness())
+
+@app.route('/events')
+def event_stream_route():
+    s = current_session()
+    q = s.events.subscribe()
+    # Anything that piled up while no browser was connected goes out first.
+    while s.messages_for_ui:
+        q.put_nowait(format_event("chat", {"text": s.messages_for_ui.popleft()}))
+    for clip_id in s.audio.pending_clip_ids():
+        q.put_nowait(format_event("audio", {"id": clip_id}))
+    q.put_nowait(format_event("status", s.get_status()))
+    q.put_nowait(format_event("readiness", s.get_readiness()))
+    return Response(stream_with_context(s.events.stream(q)), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/audio/<clip_id>')
+def get_audio_clip_route(clip_id):
+    audio = current_session().audio
+    clip = audio.get_audio_clip(clip_id)
+    if clip is None: return jsonify({"status": "error", "message": "Clip not found"}), 404
+    ranges = request.range.ranges if request.range else None
+    if not ranges or (ranges == [(0, None)] and not clip.done):
+        # Chunked response: the browser starts playing the first chunks while ElevenLabs is still sending the rest.
+        def stream():
+            yield from clip.iter_chunks()
+            if clip.done:
+                audio.clip_served(clip_id)
+        return Response(stream_with_context(stream()), mimetype='audio/mpeg', headers={'Cache-Control': 'no-cache', 'Accept-Ranges': 'bytes'})
+
+    # Safari only plays audio it can fetch in byte ranges (starting with just bytes 0-1), and a range answer
+    # needs the full length, so these wait for the clip to finish.
+    if not clip.wait_done(): return jsonify({"status": "error", "message": "Clip didn't finish"}), 504
+    response = send_file(io.BytesIO(clip.read_all()), mimetype='audio/mpeg', conditional=True, max_age=0)
+    sent = response.content_range
+    if response.status_code == 200 or (sent and sent.start == 0 and sent.stop == sent.length):
+        audio.clip_served(clip_id)
+    return response
+
+# Polling fallback for browsers that can't hold the /events stream open.
 @app.route('/get_updates')
 def get_ui_updates_route():
-    messages = [messages_for_ui.popleft() for _ in range(len(messages_for_ui))]
-    if audio_chunk := audio.get_next_audio_chunk():
+    s = current_session()
+    messages = [s.messages_for_ui.popleft() for _ in range(len(s.messages_for_ui))]
+    if messages:
+        return jsonify({"messages": messages})
+    if audio_chunk := s.audio.get_next_audio_chunk():
         return send_file(io.BytesIO(audio_chunk), mimetype='audio/mpeg')
-    return jsonify({"messages": messages})
+    return jsonify({"messages": []})
 
 @app.route('/get_status')
 def get_status_route():
-    return jsonify({"mood": current_mood, "speed": handy.last_stroke_speed, "depth": handy.last_depth_pos})
+    return jsonify(current_session().get_status())
+
+@app.route('/tts_stats')
+def tts_stats_route():
+    return jsonify(current_session().audio.get_stats())
+
+@app.route('/handy_stats')
+def handy_stats_route():
+    return jsonify(current_session().handy.get_latency_stats())
+
+@app.route('/metrics')
+def metrics_route():
+    return Response(metrics.render_prometheus(), mimetype="text/plain; version=0.0.4")
 
 @app.route('/set_depth_limits', methods=['POST'])
 def set_depth_limits_route():
+    s = current_session()
+    settings = s.settings
     depth1 = int(request.json.get('min_depth', 5)); depth2 = int(request.json.get('max_depth', 100))
     settings.min_depth = min(depth1, depth2); settings.max_depth = max(depth1, depth2)
-    handy.update_settings(settings.min_speed, settings.max_speed, settings.min_depth, settings.max_depth)
+    s.handy.update_settings(settings.min_speed, settings.max_speed, settings.min_depth, settings.max_depth)
     settings.save()
     return jsonify({"status": "success"})
 
 @app.route('/set_speed_limits', methods=['POST'])
 def set_speed_limits_route():
+    s = current_session()
+    settings = s.settings
     settings.min_speed = int(request.json.get('min_speed', 10)); settings.max_speed = int(request.json.get('max_speed', 80))
-    handy.update_settings(settings.min_speed, settings.max_speed, settings.min_depth, settings.max_depth)
+    s.handy.update_settings(settings.min_speed, settings.max_speed, settings.min_depth, settings.max_depth)
     settings.save()
     return jsonify({"status": "success"})
 
 @app.route('/like_last_move', methods=['POST'])
 def like_last_move_route():
-    last_speed = handy.last_relative_speed; last_depth = handy.last_depth_pos
-    pattern_name = llm.name_this_move(last_speed, last_depth, current_mood)
+    s = current_session()
+    last_speed = s.handy.last_relative_speed; last_depth = s.handy.last_depth_pos; last_range = s.handy.last_stroke_range
+    # Liking the same move again just counts as another like, no need to ask the LLM for a new name.
+    if existing := s.patterns.find_similar(last_speed, last_depth):
+        s.patterns.bump(existing, s.current_mood)
+        s.add_message_to_queue(f"(You really like '{existing['name']}', huh?)", add_to_history=False)
+        return jsonify({"status": "boosted", "name": existing["name"]})
     sp_range = [max(0, last_speed - 5), min(100, last_speed + 5)]; dp_range = [max(0, last_depth - 5), min(100, last_depth + 5)]
-    new_pattern = {"name": pattern_name, "sp_range": [int(p) for p in sp_range], "dp_range": [int(p) for p in dp_range], "moods": [current_mood], "score": 1}
-    settings.session_liked_patterns.append(new_pattern)
-    add_message_to_queue(f"(I'll remember that you like '{pattern_name}')", add_to_history=False)
-    return jsonify({"status": "boosted", "name": pattern_name})
+    rng_range = [max(5, last_range - 5), min(100, last_range + 5)]
+    mood = s.current_mood
+
+    # Naming waits its turn behind live chat and mode moves, so the button doesn't block on it.
+    def save_named_move(job):
+        pattern_name = "Unnamed Move" if job.cancelled() or job.exception() else job.result()
+        new_pattern = {"name": pattern_name, "sp_range": [int(p) for p in sp_range], "dp_range": [int(p) for p in dp_range], "rng_range": [int(p) for p in rng_range], "moods": [mood], "score": 1}
+        s.patterns.like(new_pattern)
+        s.add_message_to_queue(f"(I'll remember that you like '{pattern_name}')", add_to_history=False)
+    llm.name_this_move(last_speed, last_depth, mood).add_done_callback(save_named_move)
+    return jsonify({"status": "naming"})
 
 @app.route('/start_edging_mode', methods=['POST'])
 def start_edging_route():
-    start_background_mode(edging_mode_logic, "Let's play an edging game...", mode_name='edging')
+    current_session().start_background_mode(edging_mode_logic, EDGING_INTRO, mode_name='edging')
     return jsonify({"status": "edging_started"})
 
 @app.route('/start_milking_mode', methods=['POST'])
 def start_milking_route():
-    start_background_mode(milking_mode_logic, "You're so close... I'm taking over completely now.", mode_name='milking')
+    current_session().start_background_mode(milking_mode_logic, MILKING_INTRO, mode_name='milking')
     return jsonify({"status": "milking_started"})
 
+@app.route('/start_playback_mode', methods=['POST'])
+def start_playback_route():
+    current_session().start_background_mode(pattern_playback_logic, PLAYBACK_INTRO, mode_name='playback')
+    return jsonify({"status": "playback_started"})
+
 @app.route('/stop_auto_mode', methods=['POST'])
 def stop_auto_route():
-    if auto_mode_active_task: auto_mode_active_task.stop()
+    current_session().stop_background_mode()
     return jsonify({"status": "auto_mode_stopped"})
 
 # ─── APP STARTUP ───────────────────────────────────────────────────────────────────────────────────
 def on_exit():
     print("⏳ Saving settings on exit...")
-    settings.save(llm, chat_history)
+    for s in sessions.all_sessions():
+        s.save_on_exit()
     print("✅ Settings saved.")
 
 if __name__ == '__main__':
     atexit.register(on_exit)
     print(f"🚀 Starting Handy AI app at {time.strftime('%Y-%m-%d %H:%M:%S')}...")
-    app.run(host='0.0.0.0', port=5000, debug=False)
\ No newline at end of file
+    app.run(host='0.0.0.0', port=5000, debug=False, threaded=True)
@@ -0,0 +1,64 @@
+import asyncio
+import concurrent.futures
+import threading
+
+class AsyncRuntime:
+    """
+    One background event loop that every session shares for Handy, Ollama and ElevenLabs I/O.
+    Work can be tagged with a cancel group (e.g. a session id), so a stop can cancel everything in flight at once.
+    """
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self._groups = {}
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self.loop.run_forever, name="async-io", daemon=True)
+        self._thread.start()
+
+    def in_loop(self):
+        return threading.current_thread() is self._thread
+
+    def submit(self, coro, group=None):
+        """Schedules a coroutine on the shared loop and returns a concurrent.futures.Future for it."""
+        return self.track(asyncio.run_coroutine_threadsafe(coro, self.loop), group)
+
+    def track(self, future, group):
+        """Adds a concurrent.futures.Future to a cancel group, so cancel_group() reaches it too."""
+        if group is not None:
+            with self._lock:
+                self._groups.setdefault(group, set()).add(future)
+            future.add_done_callback(lambda f: self._forget(group, f))
+        return future
+
+    def _forget(self, group, future):
+        with self._lock:
+            members = self._groups.get(group)
+            if members is not None:
+                members.discard(future)
+                if not members:
+                    del self._groups[group]
+
+    def run(self, coro, group=None, timeout=None):
+        """Sync wrapper for Flask routes and worker threads. Raises concurrent.futures.CancelledError if the group is cancelled."""
+        if self.in_loop():
+            coro.close()
+            raise RuntimeError("AsyncRuntime.run() would deadlock when called from the event loop itself")
+        return self.submit(coro, group).result(timeout)
+
+    def cancel_group(self, group):
+        with self._lock:
+            futures = list(self._groups.pop(group, ()))
+        for future in futures:
+            future.cancel()
+        return len(futures)
+
+_runtime = None
+_runtime_lock = threading.Lock()
+
+def get_runtime():
+    global _runtime
+    with _runtime_lock:
+        if _runtime is None:
+            _runtime = AsyncRuntime()
+        return _runtime
+
+CancelledError = concurrent.futures.CancelledError
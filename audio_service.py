@@ -1,20 +1,98 @@
-from collections import deque
-from elevenlabs.client import ElevenLabs
+import asyncio
+import itertools
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from elevenlabs.client import AsyncElevenLabs
 from elevenlabs import Voice, VoiceSettings
+import metrics
+from async_runtime import get_runtime
+
+ELEVENLABS_API_URL = os.environ.get("STROKEGPT_ELEVENLABS_URL")  # None means the real API
+TTS_FIRST_AUDIO_SECONDS = metrics.histogram("tts_first_audio_seconds", "From a line being queued for speech to its first audio being playable", ("source",))
+TTS_SYNTHESIS_SECONDS = metrics.histogram("tts_synthesis_seconds", "Full ElevenLabs synthesis of one line")
+
+class AudioClip:
+    """An MP3 that may still be arriving from ElevenLabs. Readers get each chunk as soon as it lands."""
+    def __init__(self, clip_id):
+        self.clip_id = clip_id
+        self.chunks = []
+        self.done = False
+        self.finished_at = None
+        self.requested = False
+        self._cond = threading.Condition()
+
+    def append(self, chunk):
+        with self._cond:
+            self.chunks.append(chunk)
+            self._cond.notify_all()
+
+    def finish(self):
+        with self._cond:
+            self.done = True
+            self.finished_at = time.monotonic()
+            self._cond.notify_all()
+
+    def wait_done(self, timeout=30):
+        with self._cond:
+            return self._cond.wait_for(lambda: self.done, timeout)
+
+    def iter_chunks(self, timeout=30):
+        sent = 0
+        while True:
+            with self._cond:
+                while sent == len(self.chunks) and not self.done:
+                    if not self._cond.wait(timeout):
+                        return
+                pending = self.chunks[sent:]
+                finished = self.done
+            yield from pending
+            sent += len(pending)
+            if finished and sent == len(self.chunks):
+                return
+
+    def read_all(self):
+        with self._cond:
+            return b"".join(self.chunks)
 
 class AudioService:
-    def __init__(self):
+    MODEL_ID = "eleven_multilingual_v2"
+    VOICE_SETTINGS = {"stability": 0.4, "similarity_boost": 0.7, "style": 0.1, "use_speaker_boost": True}
+    CLIP_TTL_S = 60
+
+    def __init__(self, cache=None, prewarm_phrases=(), max_workers=2, max_queued_lines=3):
+        self.cache = cache
+        self.prewarm_phrases = list(prewarm_phrases)
         self.api_key = ""
         self.voice_id = ""
         self.is_on = False
         self.client = None
         self.available_voices = {}
-        self.audio_output_queue = deque()
+        self.audio_output_queue = OrderedDict()
+        self.max_pending_clips = 20
+        self.on_audio_ready = None
+        self._clip_ids = itertools.count(1)
+        self._queue_lock = threading.Lock()
+
+        # Synthesis runs as at most `max_workers` tasks on the shared loop; clips are published in the order their lines were queued.
+        self.runtime = get_runtime()
+        self.max_workers = max_workers
+        self.max_queued_lines = max_queued_lines
+        self._pending_lines = deque()
+        self._work_lock = threading.Lock()
+        self._active_workers = 0
+        self._in_flight = 0
+        self._next_publish_seq = 1
+        self._finished_out_of_order = {}
+        self.dropped_lines = 0
+        self._synthesis_ms = deque(maxlen=50)
+        self._first_audio_ms = deque(maxlen=50)
 
     def set_api_key(self, api_key):
         self.api_key = api_key
         try:
-            self.client = ElevenLabs(api_key=self.api_key)
+            self.client = AsyncElevenLabs(api_key=self.api_key, base_url=ELEVENLABS_API_URL)
             return True
         except Exception as e:
             print(f"🔥 Failed to initialize ElevenLabs client: {e}")
@@ -26,7 +104,7 @@ class AudioService:
             return {"status": "error", "message": "API key not set or invalid."}
         
         try:
-            voices_list = self.client.voices.get_all()
+            voices_list = self.runtime.run(self.client.voices.get_all())
             self.available_voices = {voice.name: voice.voice_id for voice in voices_list.voices}
             print(f"✅ ElevenLabs key set. Found {len(self.available_voices)} voices.")
             return {"status": "success", "voices": self.available_voices}
@@ -46,34 +124,174 @@ class AudioService:
             print(f"🎤 Voice set to '{voice_name}'. Audio is now {status_message}.")
         else:
             print(f"🎤 Audio is now {status_message}.")
+        if self.is_on and self.cache and self.prewarm_phrases:
+            self.runtime.submit(self._prewarm_cache(voice_id))
         return True, "Settings updated."
 
+    def _cache_key(self, text, voice_id=None):
+        return self.cache.make_key(voice_id or self.voice_id, self.MODEL_ID, self.VOICE_SETTINGS, text)
+
+    def _open_stream(self, text, voice_id=None):
+        return self.client.text_to_speech.stream(
+            voice_id=voice_id or self.voice_id,
+            text=text,
+            model_id=self.MODEL_ID,
+            voice_settings=VoiceSettings(**self.VOICE_SETTINGS)
+        )
+
+    async def _prewarm_cache(self, voice_id):
+        # The stock lines ("Stopping.", mode intros...) come up every session, so they're synthesized once up front.
+        for phrase in self.prewarm_phrases:
+            if not self.client or voice_id != self.voice_id:
+                return
+            key = self._cache_key(phrase, voice_id)
+            if key in self.cache:
+                continue
+            try:
+                audio_bytes_data = b"".join([chunk async for chunk in self._open_stream(phrase, voice_id)])
+                await asyncio.to_thread(self.cache.put, key, audio_bytes_data)
+            except Exception as e:
+                print(f"🔥 Couldn't pre-generate '{phrase}': {e}")
+                return
 
-    def generate_audio_for_text(self, text_to_speak):
+
+    def _should_speak(self, text_to_speak):
         if not self.is_on or not self.api_key or not self.voice_id or not self.client:
-            return
-            
-        if not text_to_speak or text_to_speak.strip().startswith(("(", "[")):
+            return False
+        return bool(text_to_speak) and not text_to_speak.strip().startswith(("(", "["))
+
+    def queue_text(self, text_to_speak):
+        """
+        Queues a line for the synthesis workers and returns its sequence number.
+        If synthesis falls behind, the oldest lines still waiting are dropped; they'd only be heard late anyway.
+        """
+        if not self._should_speak(text_to_speak):
+            return None
+        with self._work_lock:
+            seq = next(self._clip_ids)
+            self._pending_lines.append((seq, text_to_speak, time.perf_counter()))
+            while len(self._pending_lines) > self.max_queued_lines:
+                dropped_seq, dropped_text, _ = self._pending_lines.popleft()
+                self.dropped_lines += 1
+                print(f"⏭️ Voice is falling behind, skipping: '{dropped_text[:50]}...'")
+                self._publish_in_order(dropped_seq, None)
+            if self._active_workers < self.max_workers:
+                self._active_workers += 1
+                self.runtime.submit(self._synthesis_worker())
+        return seq
+
+    async def _synthesis_worker(self):
+        while True:
+            with self._work_lock:
+                if not self._pending_lines:
+                    self._active_workers -= 1
+                    return
+                seq, text_to_speak, queued_at = self._pending_lines.popleft()
+                self._in_flight += 1
+            try:
+                await self._synthesize(seq, text_to_speak, queued_at)
+            finally:
+                with self._work_lock:
+                    self._in_flight -= 1
+
+    async def _synthesize(self, seq, text_to_speak, queued_at):
+        cache_key = self._cache_key(text_to_speak) if self.cache else None
+        if cache_key and (cached_audio := await asyncio.to_thread(self.cache.get, cache_key)):
+            clip = AudioClip(str(seq))
+            clip.append(cached_audio)
+            clip.finish()
+            self._record_first_audio(queued_at, "cache")
+            self._publish_in_order(seq, clip)
             return
 
+        clip = None
         try:
             print(f"🎙️ Generating audio: '{text_to_speak[:50]}...'")
-            
-            audio_stream = self.client.text_to_speech.convert(
-                voice_id=self.voice_id,
-                text=text_to_speak,
-                model_id="eleven_multilingual_v2",
-                voice_settings=VoiceSettings(stability=0.4, similarity_boost=0.7, style=0.1, use_speaker_boost=True)
-            )
-
-            audio_bytes_data = b"".join(audio_stream)
-            self.audio_output_queue.append(audio_bytes_data)
+            started = time.perf_counter()
+
+            # The clip is published on its first chunk, so the browser can start playing while the rest is synthesized.
+            async for chunk in self._open_stream(text_to_speak):
+                if not chunk: continue
+                if clip is None:
+                    clip = AudioClip(str(seq))
+                    clip.append(chunk)
+                    self._record_first_audio(queued_at, "elevenlabs")
+                    self._publish_in_order(seq, clip)
+                else:
+                    clip.append(chunk)
+            elapsed = time.perf_counter() - started
+            self._synthesis_ms.append(elapsed * 1000.0)
+            TTS_SYNTHESIS_SECONDS.observe(elapsed)
             print("✅ Audio ready.")
+            if clip and cache_key:
+                await asyncio.to_thread(self.cache.put, cache_key, clip.read_all())
 
         except Exception as e:
             print(f"🔥 Oops, ElevenLabs problem: {e}")
-            
+        finally:
+            if clip:
+                clip.finish()
+            else:
+                self._publish_in_order(seq, None)  # nothing to play, but later clips mustn't wait on it
+
+    def _record_first_audio(self, queued_at, source):
+        elapsed = time.perf_counter() - queued_at
+        self._first_audio_ms.append(elapsed * 1000.0)
+        TTS_FIRST_AUDIO_SECONDS.observe(elapsed, source=source)
+
+    def _publish_in_order(self, seq, clip):
+        # A clip that starts early waits here until every line queued before it has been published or given up on.
+        with self._queue_lock:
+            self._finished_out_of_order[seq] = clip
+            while self._next_publish_seq in self._finished_out_of_order:
+                ready = self._finished_out_of_order.pop(self._next_publish_seq)
+                self._next_publish_seq += 1
+                if ready is None:
+                    continue
+                self.audio_output_queue[ready.clip_id] = ready
+                while len(self.audio_output_queue) > self.max_pending_clips:
+                    self.audio_output_queue.popitem(last=False)
+                if self.on_audio_ready:
+                    self.on_audio_ready(ready.clip_id)
+
+    def get_stats(self):
+        def avg(samples):
+            return round(sum(samples) / len(samples), 1) if samples else None
+        with self._work_lock:
+            queue_depth, in_flight = len(self._pending_lines), self._in_flight
+        return {
+            "queue_depth": queue_depth, "in_flight": in_flight, "dropped_lines": self.dropped_lines,
+            "avg_synthesis_ms": avg(list(self._synthesis_ms)), "avg_time_to_first_audio_ms": avg(list(self._first_audio_ms)),
+        }
+
+    def pending_clip_ids(self):
+        with self._queue_lock:
+            return [clip_id for clip_id, clip in self.audio_output_queue.items() if not clip.requested]
+
+    def get_audio_clip(self, clip_id):
+        """
+        Hands over a clip for streaming to the browser, whether or not it has finished arriving.
+        Safari fetches the same clip several times in byte ranges, so it stays here until it has been sent whole
+        once (see clip_served) or CLIP_TTL_S after it finished.
+        """
+        now = time.monotonic()
+        with self._queue_lock:
+            for stale_id in [i for i, c in self.audio_output_queue.items() if c.requested and c.done and now - c.finished_at > self.CLIP_TTL_S]:
+                del self.audio_output_queue[stale_id]
+            if clip := self.audio_output_queue.get(clip_id):
+                clip.requested = True
+            return clip
+
+    def clip_served(self, clip_id):
+        with self._queue_lock:
+            self.audio_output_queue.pop(clip_id, None)
+
     def get_next_audio_chunk(self):
-        if self.audio_output_queue:
-            return self.audio_output_queue.popleft()
+        # The polling fallback can only ship whole files, so it waits for the oldest clip to finish.
+        with self._queue_lock:
+            if self.audio_output_queue:
+                clip_id, clip = next(iter(self.audio_output_queue.items()))
+                if clip.done:
+                    del self.audio_output_queue[clip_id]
+                    return clip.read_all()
         return None
\ No newline at end of file
@@ -1,6 +1,37 @@
 import threading
 import time
 import random
+from collections import deque
+import metrics
+from intent_router import plan_fast_move
+from llm_scheduler import MODE
+
+MODE_END_MESSAGE = "Okay, you're in control now."
+MILKING_FINALE_MESSAGE = "That's it... give it all to me. Don't hold back."
+NO_PATTERNS_MESSAGE = "You haven't liked any moves yet. Hit 👍 on a few you enjoy first."
+PLAYBACK_PHASE_SECONDS = 60
+
+class RealClock:
+    """
+    Where the mode layer gets its time from. Modes take a clock (and an RNG) through `services`, so a simulation
+    can swap in a virtual clock and replay hours of a mode in seconds; see benchmarks/simulate.py.
+    """
+    def now(self):
+        return time.monotonic()
+
+    def wait(self, event, seconds):
+        """Like event.wait(seconds): True if `event` was set, False if the time ran out."""
+        return event.wait(seconds)
+
+    def sleep(self, seconds):
+        time.sleep(seconds)
+
+    def start_thread(self, target, name=None):
+        thread = threading.Thread(target=target, name=name, daemon=True)
+        thread.start()
+        return thread
+
+REAL_CLOCK = RealClock()
 
 class AutoModeThread(threading.Thread):
     def __init__(self, mode_func, initial_message, services, callbacks, mode_name="auto"):
@@ -16,10 +47,11 @@ class AutoModeThread(threading.Thread):
     def run(self):
         message_callback = self._callbacks.get('send_message')
         handy_controller = self._services.get('handy')
+        clock = self._services.get('clock', REAL_CLOCK)
         
         if message_callback:
             message_callback(self._initial_message)
-        time.sleep(2)
+        clock.wait(self._stop_event, 2)
 
         try:
             self._mode_func(self._stop_event, self._services, self._callbacks)
@@ -34,7 +66,7 @@ class AutoModeThread(threading.Thread):
                 stop_callback()
 
             if message_callback:
-                message_callback("Okay, you're in control now.")
+                message_callback(MODE_END_MESSAGE)
 
     def stop(self):
         self._stop_event.set()
@@ -45,61 +77,206 @@ def _check_for_user_message(queue):
         except IndexError: pass
     return None
 
+class MoveLookahead:
+    """
+    Plans upcoming moves on a worker thread while the current one is playing, keeping up to `depth` of them ready,
+    so the gap between moves is the configured timing rather than timing plus LLM latency.
+    Anything already planned is thrown away as soon as feedback shows up, since it was planned without it.
+    With depth=0 nothing is planned ahead: each move is planned on the caller's thread when it's asked for.
+    """
+    def __init__(self, plan_move, stop_event, take_feedback, feedback_pending, depth=2, clock=REAL_CLOCK):
+        self._plan_move = plan_move
+        self._stop_event = stop_event
+        self._take_feedback = take_feedback
+        self._feedback_pending = feedback_pending
+        self.depth = depth
+        self._clock = clock
+        self._ready = deque()
+        self._generation = 0
+        self._closed = threading.Event()
+        self._lock = threading.Lock()
+        # All waiting goes through the clock, so a simulation can run the worker in virtual time too.
+        # `_room` is set when a planned move is taken, `_arrived` when one is added.
+        self._room, self._arrived = threading.Event(), threading.Event()
+
+    def start(self):
+        if self.depth:
+            self._clock.start_thread(self._run, "move-lookahead")
+        return self
+
+    def close(self):
+        self._closed.set()
+        self._room.set()
+
+    def _stopped(self):
+        return self._stop_event.is_set() or self._closed.is_set()
+
+    def _discard_planned(self):
+        # Bumping the generation also voids whatever the worker is generating right now.
+        self._ready.clear()
+        self._generation += 1
+
+    def _run(self):
+        while not self._stopped():
+            self._room.clear()
+            with self._lock:
+                full = len(self._ready) >= self.depth and not self._feedback_pending()
+                if not full:
+                    feedback = self._take_feedback()
+                    if feedback:
+                        self._discard_planned()
+                    generation = self._generation
+            if full:
+                self._clock.wait(self._room, 0.2); continue
+
+            try:
+                planned = self._plan_move(feedback)
+            except Exception as e:
+                print(f"Move planning failed: {e}")
+                planned = None
+            if not planned:
+                self._clock.wait(self._stop_event, 1); continue
+
+            with self._lock:
+                if generation == self._generation:
+                    self._ready.append(planned)
+                    self._arrived.set()
+
+    def next_move(self):
+        """Blocks until a planned move is ready. Returns None once the mode is stopped."""
+        if not self.depth:
+            return None if self._stopped() else self._plan_move(self._take_feedback())
+        while not self._stopped():
+            self._arrived.clear()
+            with self._lock:
+                if self._feedback_pending():
+                    self._discard_planned()
+                    self._room.set()
+                elif self._ready:
+                    planned = self._ready.popleft()
+                    self._room.set()
+                    return planned
+            self._clock.wait(self._arrived, 0.2)
+        return None
+
+class MoveSlots:
+    """
+    Keeps a mode's moves on an even beat. Each move is sent early by the Handy link's current one-way delay so it
+    lands on its slot, and the next slot is counted from this one rather than from whenever the send returned,
+    so network jitter doesn't pile up into uneven gaps. If a move is late anyway (slow planning), the beat moves with it.
+    """
+    def __init__(self, handy_controller, stop_event, clock=REAL_CLOCK):
+        self.handy_controller = handy_controller
+        self.stop_event = stop_event
+        self.clock = clock
+        self.at = None  # clock.now() the next move should take effect
+        handy_controller.sync_clock()
+
+    def wait(self):
+        """Blocks until it's time to send the next move. Returns False if the mode was stopped meanwhile."""
+        link = self.handy_controller.clock
+        now = self.clock.now()
+        if self.at is None or self.at < link.effect_time(now):
+            self.at = link.effect_time(now)
+        return not self.clock.wait(self.stop_event, max(0.0, self.at - link.lead_s - self.clock.now()))
+
+    def sending(self):
+        """Call right before sending; a move that goes out late (planning took too long) moves the beat with it."""
+        self.at = max(self.at, self.handy_controller.clock.effect_time(self.clock.now()))
+
+    def advance(self, seconds):
+        self.at += seconds
+
+    def restart(self):
+        """The next move starts a new beat as soon as it can be sent."""
+        self.at = None
+
+def _plan_from_llm(llm_service, prompt, context, temperature, mood=None, cancel_group=None):
+    with metrics.trace_turn("mode plan"):
+        response = llm_service.get_chat_response([{"role": "user", "content": prompt}], context, temperature=temperature, cancel_group=cancel_group, priority=MODE)
+    if not response or not response.get("move"):
+        return None
+    return {"response": response, "mood": mood}
+
+def _play_move(planned, handy_controller, send_message, update_mood=None):
+    response = planned["response"]
+    if update_mood and planned.get("mood"): update_mood(planned["mood"])
+    if move_data := response.get("move"):
+        handy_controller.move(move_data.get("sp"), move_data.get("dp"), move_data.get("rng"))
+    if chat_text := response.get("chat"): send_message(chat_text)
+
 def auto_mode_logic(stop_event, services, callbacks):
     llm_service, handy_controller = services['llm'], services['handy']
+    cancel_group = services.get('cancel_group')
+    clock, rand = services.get('clock', REAL_CLOCK), services.get('rng', random)
     get_context, send_message, get_timings, message_queue = callbacks['get_context'], callbacks['send_message'], callbacks['get_timings'], callbacks['message_queue']
-    
-    while not stop_event.is_set():
-        auto_min, auto_max = get_timings('auto')
+
+    def plan_move(user_message):
         context = get_context()
         context['current_mood'] = "Curious"
         
         prompt = f"You are in Automode. Your goal is to create a varied and exciting experience. Do something different now."
         
-        if user_message := _check_for_user_message(message_queue):
+        if user_message:
             prompt += f"\n\n**USER FEEDBACK TO CONSIDER:** \"{user_message}\"\n\n**INSTRUCTION:** Analyze the user's feedback. Let it influence your next move and what you say. For example, if they say 'faster', increase the speed."
         
-        response = llm_service.get_chat_response([{"role": "user", "content": prompt}], context, temperature=1.1)
+        return _plan_from_llm(llm_service, prompt, context, 1.1, cancel_group=cancel_group)
 
-        if not response or not response.get("move"):
-            time.sleep(1); continue
-        
-        if chat_text := response.get("chat"): send_message(chat_text)
-        if move_data := response.get("move"):
-            handy_controller.move(move_data.get("sp"), move_data.get("dp"), move_data.get("rng"))
-        time.sleep(random.uniform(auto_min, auto_max))
+    lookahead = MoveLookahead(plan_move, stop_event, lambda: _check_for_user_message(message_queue), lambda: bool(message_queue),
+                              depth=services.get('lookahead', 2), clock=clock).start()
+    slots = MoveSlots(handy_controller, stop_event, clock)
+    try:
+        while not stop_event.is_set():
+            if not slots.wait() or not (planned := lookahead.next_move()): break
+            auto_min, auto_max = get_timings('auto')
+            slots.sending()
+            _play_move(planned, handy_controller, send_message)
+            slots.advance(rand.uniform(auto_min, auto_max))
+    finally:
+        lookahead.close()
 
 def milking_mode_logic(stop_event, services, callbacks):
     llm_service, handy_controller = services['llm'], services['handy']
+    cancel_group = services.get('cancel_group')
+    clock, rand = services.get('clock', REAL_CLOCK), services.get('rng', random)
     get_context, send_message, get_timings, message_queue = callbacks['get_context'], callbacks['send_message'], callbacks['get_timings'], callbacks['message_queue']
 
-    for _ in range(random.randint(6, 9)):
-        if stop_event.is_set(): break
-        milking_min, milking_max = get_timings('milking')
+    def plan_move(user_message):
         context = get_context()
         context['current_mood'] = "Dominant"
         
         prompt = f"You are in 'milking' mode. Your only goal is to make me cum. Invent a DIFFERENT, high-intensity move now."
         
-        if user_message := _check_for_user_message(message_queue):
+        if user_message:
             prompt += f"\n\n**USER FEEDBACK TO CONSIDER:** \"{user_message}\"\n\n**INSTRUCTION:** The user is close to climax. Analyze their feedback and let it influence your final moves to push them over the edge."
 
-        response = llm_service.get_chat_response([{"role": "user", "content": prompt}], context, temperature=1.0)
+        return _plan_from_llm(llm_service, prompt, context, 1.0, cancel_group=cancel_group)
 
-        if not response or not response.get("move"):
-            time.sleep(1); continue
-        
-        if response.get("chat"): send_message(response.get("chat"))
-        if move_data := response.get("move"):
-            handy_controller.move(move_data.get("sp"), move_data.get("dp"), move_data.get("rng"))
-        time.sleep(random.uniform(milking_min, milking_max))
+    lookahead = MoveLookahead(plan_move, stop_event, lambda: _check_for_user_message(message_queue), lambda: bool(message_queue),
+                              depth=services.get('lookahead', 2), clock=clock).start()
+    slots = MoveSlots(handy_controller, stop_event, clock)
+    try:
+        for _ in range(rand.randint(6, 9)):
+            if stop_event.is_set(): break
+            if not slots.wait() or not (planned := lookahead.next_move()): break
+            milking_min, milking_max = get_timings('milking')
+            slots.sending()
+            _play_move(planned, handy_controller, send_message)
+            slots.advance(rand.uniform(milking_min, milking_max))
+        # The last move still gets its full time before the finale.
+        if not stop_event.is_set() and slots.at is not None:
+            clock.wait(stop_event, max(0.0, slots.at - clock.now()))
+    finally:
+        lookahead.close()
     
     if not stop_event.is_set():
-        send_message("That's it... give it all to me. Don't hold back.")
-        time.sleep(4)
+        send_message(MILKING_FINALE_MESSAGE)
+        clock.sleep(4)
 
 def edging_mode_logic(stop_event, services, callbacks):
     llm_service, handy_controller = services['llm'], services['handy']
+    cancel_group = services.get('cancel_group')
+    clock, rand = services.get('clock', REAL_CLOCK), services.get('rng', random)
     get_context, send_message, get_timings, update_mood = callbacks['get_context'], callbacks['send_message'], callbacks['get_timings'], callbacks['update_mood']
     user_signal_event = callbacks['user_signal_event']
     message_queue = callbacks['message_queue']
@@ -108,19 +285,24 @@ def edging_mode_logic(stop_event, services, callbacks):
     states = ["BUILD_UP", "TEASE", "HOLD", "RECOVERY"]
     current_state = "BUILD_UP"
 
-    while not stop_event.is_set():
-        edging_min, edging_max = get_timings('edging')
+    def take_feedback():
+        user_message = _check_for_user_message(message_queue)
+        edged = user_signal_event.is_set()
+        user_signal_event.clear()
+        return (user_message, edged) if user_message or edged else None
+
+    # The state machine runs at planning time, so it stays one or two moves ahead of what's playing.
+    def plan_move(feedback):
+        nonlocal edge_count, current_state
+        user_message, edged = feedback or (None, False)
         context = get_context()
         context['edge_count'] = edge_count
-        prompt = ""
         
-        user_message = _check_for_user_message(message_queue)
-        
-        if user_signal_event.is_set():
-            user_signal_event.clear()
+        if edged:
             edge_count += 1
             context['edge_count'] = edge_count
-            update_mood("Dominant")
+            mood = "Dominant"
+            context['current_mood'] = mood
             prompt = f"I am on the edge. I have been edged {edge_count} times. You must choose one of three reactions: 1. A hard 'Pull Back'. 2. A 'Hold'. 3. A risky 'Push Over'. Describe what you choose to do and provide the move."
             current_state = "PULL_BACK"
         else:
@@ -132,27 +314,91 @@ def edging_mode_logic(stop_event, services, callbacks):
             }
             moods = {"BUILD_UP": "Seductive", "TEASE": "Playful", "HOLD": "Confident", "RECOVERY": "Loving"}
             if current_state not in moods: current_state = "BUILD_UP"
-            update_mood(moods[current_state])
+            mood = moods[current_state]
+            context['current_mood'] = mood
             prompt = prompts[current_state]
 
             if user_message:
                 prompt += f"\n\n**USER MESSAGE TO CONSIDER:** \"{user_message}\"\n\n**INSTRUCTION:** Analyze this message. Decide if you should alter your pattern or state in response to it. Then, describe your action and provide the next `move`."
 
-        response = llm_service.get_chat_response([{"role": "user", "content": prompt}], context, temperature=1.1)
-        if not response or not response.get("move"):
-            time.sleep(1); continue
-        
-        if chat_text := response.get("chat"): send_message(chat_text)
-        if move_data := response.get("move"):
-            handy_controller.move(move_data.get("sp"), move_data.get("dp"), move_data.get("rng"))
+        planned = _plan_from_llm(llm_service, prompt, context, 1.1, mood=mood, cancel_group=cancel_group)
+        if not planned:
+            return None
 
         if current_state != "PULL_BACK":
-            current_state = random.choice(states)
+            current_state = rand.choice(states)
         else:
             current_state = "RECOVERY"
+        return planned
 
-        time.sleep(random.uniform(edging_min, edging_max))
+    lookahead = MoveLookahead(plan_move, stop_event, take_feedback, lambda: bool(message_queue) or user_signal_event.is_set(),
+                              depth=services.get('lookahead', 2), clock=clock).start()
+    slots = MoveSlots(handy_controller, stop_event, clock)
+    try:
+        while not stop_event.is_set():
+            if not slots.wait() or not (planned := lookahead.next_move()): break
+            edging_min, edging_max = get_timings('edging')
+            slots.sending()
+            _play_move(planned, handy_controller, send_message, update_mood)
+            slots.advance(rand.uniform(edging_min, edging_max))
+    finally:
+        lookahead.close()
 
     if not stop_event.is_set():
         send_message(f"You did so well, holding it in for {edge_count} edges...")
-        update_mood("Afterglow")
\ No newline at end of file
+        update_mood("Afterglow")
+
+def pattern_playback_logic(stop_event, services, callbacks):
+    """
+    Plays saved patterns straight to the Handy, no LLM involved, so it works even while Ollama is busy or slow.
+    About a minute of moves at a time is sent as one script; if the Handy won't take it, they're sent move by move.
+    Movement commands from chat ("faster", "go deeper") change the next move; the app answers anything else itself.
+    """
+    pattern_store, handy_controller = services['patterns'], services['handy']
+    clock, rand = services.get('clock', REAL_CLOCK), services.get('rng', random)
+    # Only the mood is needed per move, so it's read directly rather than building the whole LLM context each time.
+    get_mood, send_message, get_timings = callbacks['get_mood'], callbacks['send_message'], callbacks['get_timings']
+    message_queue = callbacks['message_queue']
+
+    if not len(pattern_store):
+        send_message(NO_PATTERNS_MESSAGE)
+        return
+
+    def next_move():
+        pattern = pattern_store.pick(get_mood(), rand)
+        sp = rand.randint(*pattern.get("sp_range", [40, 60]))
+        dp = rand.randint(*pattern.get("dp_range", [40, 60]))
+        rng = rand.randint(*pattern.get("rng_range", [40, 60]))
+        auto_min, auto_max = get_timings('auto')
+        return sp, dp, rng, rand.uniform(auto_min, auto_max)
+
+    def steer(last):
+        """The move asked for by the latest movement command in the queue, counted from `last`, or None."""
+        steered = None
+        while (user_message := _check_for_user_message(message_queue)) is not None:
+            if fast_move := plan_fast_move(user_message, *(steered or last), rand=rand)[0]:
+                steered = (fast_move["sp"], fast_move["dp"], fast_move["rng"])
+        return steered
+
+    last = None
+    slots = MoveSlots(handy_controller, stop_event, clock)
+    while slots.wait():
+        moves = [next_move()]
+        while sum(move[3] for move in moves) < PLAYBACK_PHASE_SECONDS:
+            moves.append(next_move())
+        if scripted := handy_controller.play_script(handy_controller.build_script(moves)):
+            slots.restart()  # the script keeps its own time from here on; this just follows along
+        for sp, dp, rng, seconds in moves:
+            if not slots.wait():
+                return
+            slots.sending()
+            if steered := steer(last or (sp, dp, rng)):
+                sp, dp, rng = steered
+            if scripted and not steered:
+                handy_controller.track_script_move(sp, dp, rng)
+            else:
+                handy_controller.move(sp, dp, rng)
+            last = (sp, dp, rng)
+            slots.advance(seconds)
+            if scripted and steered:
+                break  # the rest of the script was planned before the message; the next batch starts after this move
@@ -0,0 +1,259 @@
+"""
+Local stand-ins for Ollama, the Handy v2 API and ElevenLabs, so the app can be benchmarked without
+a GPU, a device or an API key. Each one runs on its own thread on a free port and exposes `.url`.
+"""
+import json
+import random
+from email.parser import BytesParser
+from email.policy import HTTP
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+class _MockServer:
+    def __init__(self):
+        handler = type("Handler", (self._Handler,), {"mock": self})
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+
+    def start(self):
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    class _Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def _read_json(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            return json.loads(self.rfile.read(length) or b"{}")
+
+        def _send_json(self, obj, status=200):
+            body = json.dumps(obj).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _start_chunked(self, content_type):
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+
+        def _write_chunk(self, data):
+            self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+            self.wfile.flush()
+
+        def _end_chunked(self):
+            self.wfile.write(b"0\r\n\r\n")
+            self.wfile.flush()
+
+class MockOllama(_MockServer):
+    """
+    Answers /api/chat like Ollama would, generating a JSON reply at `tokens_per_sec` (about 4 characters a token)
+    after `first_token_s` of prompt processing, with up to `jitter` of random slowdown per token.
+    Moves are random so every reply actually changes what the Handy is doing.
+    The first request of all pays `load_s` for loading the model; a chat with no messages only loads it, like the real thing.
+    """
+    def __init__(self, tokens_per_sec=40.0, first_token_s=0.15, jitter=0.2, chat_words=25, load_s=0.0):
+        super().__init__()
+        self.tokens_per_sec = tokens_per_sec
+        self.first_token_s = first_token_s
+        self.jitter = jitter
+        self.chat_words = chat_words
+        self.load_s = load_s
+        self.loaded = False
+        self._load_lock = threading.Lock()
+        self.requests = 0
+        self.url = f"http://127.0.0.1:{self.port}/api/chat"
+
+    def make_reply(self, messages):
+        prompt = messages[0].get("content", "") if messages else ""
+        if '"pattern_name"' in prompt:
+            return {"pattern_name": "The Benchmark"}
+        if '"summary"' in prompt:
+            return {"summary": "They chatted for a while."}
+        if '"add_likes"' in prompt:
+            return {"name": None, "add_likes": [], "remove_likes": [], "add_dislikes": [], "remove_dislikes": [], "add_key_memories": [], "remove_key_memories": []}
+        chat = " ".join(random.choice(["mmm", "yes", "just", "like", "that", "slowly", "deeper", "darling"]) for _ in range(self.chat_words))
+        return {"move": {"sp": random.randint(10, 90), "dp": random.randint(10, 90), "rng": random.randint(20, 90)}, "chat": chat, "new_mood": "Playful"}
+
+    def load_model(self):
+        """Seconds spent loading the model for this request: `load_s` the first time, 0 after that."""
+        with self._load_lock:
+            if self.loaded:
+                return 0.0
+            time.sleep(self.load_s)
+            self.loaded = True
+            return self.load_s
+
+    def timings(self, body, tokens, started, load_s=0.0):
+        """The stats Ollama adds to its last message, in nanoseconds."""
+        prompt_chars = sum(len(m.get("content", "")) for m in body.get("messages", []))
+        return {"load_duration": int(load_s * 1e9), "prompt_eval_count": prompt_chars // 4, "prompt_eval_duration": int(self.first_token_s * 1e9),
+                "eval_count": len(tokens), "eval_duration": int((time.perf_counter() - started) * 1e9)}
+
+    def token_delay(self):
+        return (1.0 / self.tokens_per_sec) * (1.0 + random.uniform(0, self.jitter))
+
+    class _Handler(_MockServer._Handler):
+        def do_POST(self):
+            mock = self.mock
+            body = self._read_json()
+            mock.requests += 1
+            load_s = mock.load_model()
+            if not body.get("messages"):
+                self._send_json({"model": body.get("model"), "message": {"role": "assistant", "content": ""}, "done_reason": "load", "done": True})
+                return
+            text = json.dumps(mock.make_reply(body.get("messages", [])))
+            tokens = [text[i:i + 4] for i in range(0, len(text), 4)]
+            time.sleep(mock.first_token_s)
+            started = time.perf_counter()
+            try:
+                if not body.get("stream"):
+                    time.sleep(sum(mock.token_delay() for _ in tokens))
+                    self._send_json({"message": {"role": "assistant", "content": text}, "done": True, **mock.timings(body, tokens, started, load_s)})
+                    return
+                self._start_chunked("application/x-ndjson")
+                for token in tokens:
+                    self._write_chunk((json.dumps({"message": {"role": "assistant", "content": token}, "done": False}) + "\n").encode())
+                    time.sleep(mock.token_delay())
+                final = {"message": {"role": "assistant", "content": ""}, "done": True, **mock.timings(body, tokens, started, load_s)}
+                self._write_chunk((json.dumps(final) + "\n").encode())
+                self._end_chunked()
+            except (BrokenPipeError, ConnectionResetError):
+                pass  # the app cancelled the request
+
+class MockHandy(_MockServer):
+    """
+    The parts of the Handy v2 REST API that HandyController uses, plus the script hosting upload used by HSSP mode.
+    Every command is logged with the time it arrived, and uploaded scripts are kept in `scripts` by URL.
+    """
+    def __init__(self, latency_s=0.05, jitter_s=0.0):
+        super().__init__()
+        self.latency_s = latency_s
+        self.jitter_s = jitter_s
+        self.url = f"http://127.0.0.1:{self.port}/api/handy/v2/"
+        self.hosting_url = f"http://127.0.0.1:{self.port}/api/hosting/v2/"
+        self.log = []  # (arrival time, path, body)
+        self.scripts = {}  # url -> CSV bytes
+        self._log_lock = threading.Lock()
+        self.travel_mm = 110.0
+        self.full_speed_mm_s = 400.0
+        self._slide = (0, 100)
+        self._velocity = 0
+        self._hamp_since = None
+
+    @property
+    def position_mm(self):
+        """Where a HAMP stroke would be right now: a triangle wave across the slide range at the set velocity."""
+        low, high = (self.travel_mm * p / 100.0 for p in self._slide)
+        if self._hamp_since is None or not self._velocity or high <= low:
+            return (low + high) / 2
+        half_stroke_s = (high - low) / (self.full_speed_mm_s * self._velocity / 100.0)
+        phase = ((time.perf_counter() - self._hamp_since) / half_stroke_s) % 2
+        return low + (high - low) * (phase if phase < 1 else 2 - phase)
+
+    def _apply(self, path, body):
+        if path == "hamp/start":
+            self._hamp_since = time.perf_counter()
+        elif path in ("hamp/stop", "mode"):
+            self._hamp_since = None
+        elif path == "slide":
+            self._slide = (body.get("min", 0), body.get("max", 100))
+        elif path == "hamp/velocity":
+            self._velocity = body.get("velocity", 0)
+
+    def commands_since(self, since, paths=None):
+        with self._log_lock:
+            return [entry for entry in self.log if entry[0] >= since and (paths is None or entry[1] in paths)]
+
+    def clear(self):
+        with self._log_lock:
+            self.log.clear()
+
+    def one_way_delay(self):
+        """Half the round trip each way, plus up to `jitter_s` extra on the way in."""
+        return self.latency_s / 2 + random.uniform(0, self.jitter_s)
+
+    class _Handler(_MockServer._Handler):
+        def _path(self):
+            return self.path.split("/api/handy/v2/", 1)[-1]
+
+        def do_PUT(self):
+            body = self._read_json()
+            # Logged when it would reach the device, after the trip there.
+            time.sleep(self.mock.one_way_delay())
+            with self.mock._log_lock:
+                self.mock.log.append((time.perf_counter(), self._path(), body))
+                self.mock._apply(self._path(), body)
+            time.sleep(self.mock.latency_s / 2)
+            self._send_json({"result": 0})
+
+        def do_GET(self):
+            time.sleep(self.mock.one_way_delay())
+            server_time = int(time.time() * 1000)
+            time.sleep(self.mock.latency_s / 2)
+            if self._path().startswith("slide/position/absolute"):
+                self._send_json({"position": self.mock.position_mm})
+            elif self._path() == "servertime":
+                self._send_json({"serverTime": server_time})
+            else:
+                self._send_json({"result": 0})
+
+        def do_POST(self):
+            if not self.path.endswith("/api/hosting/v2/upload"):
+                self._send_json({"error": "not found"}, status=404)
+                return
+            length = int(self.headers.get("Content-Length") or 0)
+            head = f"Content-Type: {self.headers.get('Content-Type')}\r\n\r\n".encode()
+            form = BytesParser(policy=HTTP).parsebytes(head + self.rfile.read(length))
+            data = next((part.get_payload(decode=True) for part in form.iter_parts() if part.get_param("name", header="content-disposition") == "file"), b"")
+            with self.mock._log_lock:
+                url = f"{self.mock.hosting_url}scripts/{len(self.mock.scripts)}.csv"
+                self.mock.scripts[url] = data
+            self._send_json({"url": url})
+
+class MockElevenLabs(_MockServer):
+    """Voice list plus a streaming text-to-speech endpoint that sends fake MP3 bytes after `first_byte_s`."""
+    VOICE_ID = "benchvoice"
+
+    def __init__(self, first_byte_s=0.25, chunk_bytes=4096, bytes_per_char=300, chunk_interval_s=0.02):
+        super().__init__()
+        self.first_byte_s = first_byte_s
+        self.chunk_bytes = chunk_bytes
+        self.bytes_per_char = bytes_per_char
+        self.chunk_interval_s = chunk_interval_s
+        self.url = f"http://127.0.0.1:{self.port}"
+
+    class _Handler(_MockServer._Handler):
+        def do_GET(self):
+            if self.path.startswith("/v1/voices"):
+                self._send_json({"voices": [{"voice_id": MockElevenLabs.VOICE_ID, "name": "Benchmark"}]})
+            else:
+                self._send_json({"detail": "not found"}, status=404)
+
+        def do_POST(self):
+            mock = self.mock
+            body = self._read_json()
+            remaining = max(mock.chunk_bytes, len(body.get("text", "")) * mock.bytes_per_char)
+            time.sleep(mock.first_byte_s)
+            self._start_chunked("audio/mpeg")
+            try:
+                while remaining > 0:
+                    size = min(mock.chunk_bytes, remaining)
+                    self._write_chunk(b"\xff" * size)
+                    remaining -= size
+                    time.sleep(mock.chunk_interval_s)
+                self._end_chunked()
+            except (BrokenPipeError, ConnectionResetError):
+                pass
@@ -0,0 +1,353 @@
+"""
+End-to-end latency benchmarks. Starts the mock Ollama, Handy and ElevenLabs servers, points the app at them,
+runs the real Flask app on a local port and drives it over HTTP the way the browser does.
+
+    python -m benchmarks.run_benchmarks                      # run and print the report
+    python -m benchmarks.run_benchmarks --save-baseline NAME # ...and save the results as a baseline
+    python -m benchmarks.run_benchmarks --compare NAME       # ...and compare against a saved baseline
+"""
+import argparse
+import json
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import httpx
+
+from benchmarks.mock_servers import MockOllama, MockHandy, MockElevenLabs
+
+REPO_DIR = Path(__file__).resolve().parent.parent
+BASELINE_DIR = Path(__file__).resolve().parent / "baselines"
+MOVE_COMMANDS = {"mode", "hamp/start", "slide", "hamp/velocity"}
+# Longer than the mock LLM takes to plan one mode move at the default settings (about 1.7-1.9 s), so planning
+# ahead can keep up and the cadence numbers measure the mode's timing rather than how fast the LLM is.
+MODE_INTERVAL_S = 2.5
+NEUTRAL_MESSAGES = ["tell me about your day", "what are you thinking about", "talk to me", "how does that feel"]
+
+def summarize(samples):
+    if not samples:
+        return {"count": 0}
+    ordered = sorted(samples)
+    return {
+        "count": len(ordered),
+        "mean": round(statistics.fmean(ordered), 1),
+        "p50": round(ordered[len(ordered) // 2], 1),
+        "p95": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 1),
+    }
+
+def wait_for(predicate, timeout=10.0, interval=0.005):
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        if result := predicate():
+            return result
+        time.sleep(interval)
+    return None
+
+def write_settings(workdir, elevenlabs):
+    settings = {
+        "handy_key": "benchmark", "persona_desc": "A benchmark partner",
+        "auto_min_time": MODE_INTERVAL_S, "auto_max_time": MODE_INTERVAL_S,
+        "milking_min_time": MODE_INTERVAL_S, "milking_max_time": MODE_INTERVAL_S,
+        "edging_min_time": MODE_INTERVAL_S, "edging_max_time": MODE_INTERVAL_S,
+        # One burst of commands per move, so cadence can be read off the command log; bench_transitions turns it on.
+        "smooth_transitions": False,
+        "patterns": [
+            {"name": f"Bench {i}", "sp_range": [20 + i * 10, 30 + i * 10], "dp_range": [30, 70], "rng_range": [30, 60], "moods": ["Curious"], "score": i + 1}
+            for i in range(5)
+        ],
+    }
+    if elevenlabs:
+        settings.update({"elevenlabs_api_key": "benchmark", "elevenlabs_voice_id": MockElevenLabs.VOICE_ID})
+    (Path(workdir) / "my_settings.json").write_text(json.dumps(settings))
+
+class EventListener(threading.Thread):
+    """Holds the /events stream open like the browser does and timestamps every event."""
+    def __init__(self, base_url, cookies):
+        super().__init__(daemon=True)
+        self.base_url = base_url
+        self.cookies = cookies
+        self.events = []  # (time, event, data)
+        self._lock = threading.Lock()
+        self._closed = threading.Event()
+
+    def run(self):
+        with httpx.Client(base_url=self.base_url, cookies=self.cookies, timeout=None) as client:
+            with client.stream("GET", "/events") as response:
+                event = None
+                for line in response.iter_lines():
+                    if self._closed.is_set():
+                        return
+                    if line.startswith("event:"):
+                        event = line.split(":", 1)[1].strip()
+                    elif line.startswith("data:") and event:
+                        with self._lock:
+                            self.events.append((time.perf_counter(), event, json.loads(line.split(":", 1)[1])))
+                        event = None
+
+    def first_since(self, since, event):
+        with self._lock:
+            return next((e for e in self.events if e[0] >= since and e[1] == event), None)
+
+    def close(self):
+        self._closed.set()
+
+def first_command_since(handy_mock, since, paths):
+    commands = handy_mock.commands_since(since, paths)
+    return min(commands, key=lambda c: c[0]) if commands else None
+
+def bench_startup(client, started):
+    """From importing the app to its first answer, and to everything it warms in the background being ready."""
+    client.get("/check_settings")
+    first_response_ms = (time.perf_counter() - started) * 1000
+    ready = wait_for(lambda: client.get("/readiness").json().get("ready"), timeout=120, interval=0.05)
+    return {"first_response": round(first_response_ms, 1), "all_ready": round((time.perf_counter() - started) * 1000, 1) if ready else None}
+
+def bench_message_latency(client, handy_mock, rounds, messages):
+    samples = []
+    for i in range(rounds):
+        handy_mock.clear()
+        started = time.perf_counter()
+        client.post("/send_message", json={"message": messages[i % len(messages)]})
+        if command := wait_for(lambda: first_command_since(handy_mock, started, MOVE_COMMANDS), timeout=5):
+            samples.append((command[0] - started) * 1000.0)
+        time.sleep(0.2)
+    return summarize(samples)
+
+def bench_stop_latency(client, handy_mock, rounds):
+    samples = []
+    for _ in range(rounds):
+        client.post("/send_message", json={"message": "faster"})
+        time.sleep(0.3)
+        started = time.perf_counter()
+        client.post("/send_message", json={"message": "stop"})
+        if command := wait_for(lambda: first_command_since(handy_mock, started, {"hamp/stop"}), timeout=5):
+            samples.append((command[0] - started) * 1000.0)
+        time.sleep(0.3)
+    return summarize(samples)
+
+def move_start_times(commands, gap_s=0.1):
+    """Commands sent for one move arrive together; the first of each burst is when that move started."""
+    starts, last = [], None
+    for arrived, _, _ in sorted(commands, key=lambda c: c[0]):
+        if last is None or arrived - last > gap_s:
+            starts.append(arrived)
+        last = arrived
+    return starts
+
+def bench_mode_cadence(client, handy_mock, start, duration_s):
+    method, path, body = start
+    started = time.perf_counter()
+    client.request(method, path, json=body)
+    time.sleep(duration_s)
+    client.post("/stop_auto_mode")
+    time.sleep(0.5)
+    # Commands for one move can arrive up to the link's jitter apart.
+    starts = move_start_times(handy_mock.commands_since(started, MOVE_COMMANDS - {"mode"}), gap_s=0.1 + handy_mock.jitter_s)
+    intervals = [b - a for a, b in zip(starts, starts[1:])]
+    errors = [abs(i - MODE_INTERVAL_S) * 1000.0 for i in intervals]
+    return {
+        "moves": len(starts),
+        "expected_interval_ms": MODE_INTERVAL_S * 1000.0,
+        "interval_ms": summarize([i * 1000.0 for i in intervals]),
+        "abs_error_ms": summarize(errors),
+    }
+
+def bench_scripted_playback(client, handy_mock, duration_s):
+    """Playback mode sends its moves as HSSP scripts, so what's worth counting is requests per minute of motion."""
+    uploaded_before = len(handy_mock.scripts)
+    started = time.perf_counter()
+    client.post("/start_playback_mode")
+    time.sleep(duration_s)
+    client.post("/stop_auto_mode")
+    time.sleep(0.5)
+    commands = handy_mock.commands_since(started)
+    scripts = list(handy_mock.scripts.values())[uploaded_before:]
+    script_seconds = sum(int(script.splitlines()[-1].split(b",")[0]) for script in scripts if script) / 1000.0
+    play = first_command_since(handy_mock, started, {"hssp/play"})
+    return {
+        "scripts_uploaded": len(scripts),
+        "script_seconds": round(script_seconds, 1),
+        "handy_requests": len(commands),
+        "handy_requests_per_motion_minute": round(len(commands) / script_seconds * 60, 1) if script_seconds else None,
+        "start_to_play_ms": round((play[0] - started) * 1000.0, 1) if play else None,
+    }
+
+def bench_transitions(client, handy_mock, rounds):
+    """With smooth transitions on, how many commands a big fast-path change costs and how long it takes to settle."""
+    client.post("/set_smooth_transitions", json={"enabled": True})
+    first_ms, settle_ms, counts = [], [], []
+    for i in range(rounds * 2):
+        handy_mock.clear()
+        started = time.perf_counter()
+        client.post("/send_message", json={"message": "deepthroat" if i % 2 else "just the tip"})
+        time.sleep(2.0)
+        commands = sorted(handy_mock.commands_since(started, MOVE_COMMANDS), key=lambda c: c[0])
+        if commands:
+            first_ms.append((commands[0][0] - started) * 1000.0)
+            settle_ms.append((commands[-1][0] - started) * 1000.0)
+            counts.append(len(commands))
+    client.post("/set_smooth_transitions", json={"enabled": False})
+    return {"first_command_ms": summarize(first_ms), "settled_ms": summarize(settle_ms), "commands_per_move": summarize(counts)}
+
+def bench_tts_first_byte(client, listener, rounds):
+    samples = []
+    for i in range(rounds):
+        started = time.perf_counter()
+        client.post("/send_message", json={"message": NEUTRAL_MESSAGES[i % len(NEUTRAL_MESSAGES)]})
+        audio_event = wait_for(lambda: listener.first_since(started, "audio"), timeout=10)
+        if not audio_event:
+            continue
+        with client.stream("GET", f"/audio/{audio_event[2]['id']}") as response:
+            chunks = response.iter_bytes()
+            for chunk in chunks:
+                if chunk:
+                    samples.append((time.perf_counter() - started) * 1000.0)
+                    break
+            for _ in chunks:
+                pass
+        time.sleep(0.2)
+    return summarize(samples)
+
+def bench_throughput(base_url, cookies, path, method, body, duration_s, workers):
+    latencies, errors = [], 0
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration_s
+
+    def worker():
+        nonlocal errors
+        with httpx.Client(base_url=base_url, cookies=cookies, timeout=30) as client:
+            while time.perf_counter() < deadline:
+                started = time.perf_counter()
+                try:
+                    ok = client.request(method, path, json=body).status_code < 500
+                except httpx.HTTPError:
+                    ok = False
+                with lock:
+                    if ok: latencies.append((time.perf_counter() - started) * 1000.0)
+                    else: errors += 1
+
+    threads = [threading.Thread(target=worker) for _ in range(workers)]
+    for t in threads: t.start()
+    for t in threads: t.join()
+    return {"requests_per_sec": round(len(latencies) / duration_s, 1), "errors": errors, "latency_ms": summarize(latencies)}
+
+def flatten(results, prefix=""):
+    flat = {}
+    for key, value in results.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten(value, name + "."))
+        elif isinstance(value, (int, float)) and not key == "count":
+            flat[name] = value
+    return flat
+
+def compare(results, baseline):
+    current, previous = flatten(results), flatten(baseline.get("results", {}))
+    print(f"\n{'metric':<60}{'baseline':>12}{'now':>12}{'change':>10}")
+    for name in sorted(current.keys() & previous.keys()):
+        before, now = previous[name], current[name]
+        change = f"{(now - before) / before * 100:+.0f}%" if before else "-"
+        print(f"{name:<60}{before:>12}{now:>12}{change:>10}")
+
+def run(args):
+    ollama = MockOllama(tokens_per_sec=args.tokens_per_sec, first_token_s=args.first_token_s, jitter=args.jitter, load_s=args.ollama_load_s).start()
+    handy_mock = MockHandy(latency_s=args.handy_latency_s, jitter_s=args.handy_jitter_s).start()
+    elevenlabs = MockElevenLabs(first_byte_s=args.tts_first_byte_s).start()
+    os.environ["STROKEGPT_LLM_URL"] = ollama.url
+    os.environ["STROKEGPT_HANDY_URL"] = handy_mock.url
+    os.environ["STROKEGPT_HANDY_HOSTING_URL"] = handy_mock.hosting_url
+    os.environ["STROKEGPT_ELEVENLABS_URL"] = elevenlabs.url
+
+    # The app keeps its settings and caches in the working directory, so give it a scratch one.
+    workdir = tempfile.mkdtemp(prefix="strokegpt-bench-")
+    write_settings(workdir, elevenlabs=True)
+    os.chdir(workdir)
+    sys.path.insert(0, str(REPO_DIR))
+    started = time.perf_counter()
+    import app as strokegpt
+    from werkzeug.serving import make_server
+
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    server = make_server("127.0.0.1", 0, strokegpt.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_port}"
+    # The first browser to show up owns my_settings.json; the benchmark takes that cookie and uses it everywhere.
+    cookies = {strokegpt.SESSION_COOKIE: httpx.get(base_url + "/").cookies[strokegpt.SESSION_COOKIE]}
+    rounds, mode_seconds, throughput_seconds = (3, 12, 3) if args.quick else (10, 25, 8)
+
+    results = {}
+    with httpx.Client(base_url=base_url, cookies=cookies, timeout=30) as client:
+        print("⏱️ Startup...")
+        results["startup_ms"] = bench_startup(client, started)
+        print("⏱️ Message → first Handy command...")
+        results["message_to_first_handy_command_ms"] = {
+            "llm": bench_message_latency(client, handy_mock, rounds, NEUTRAL_MESSAGES),
+            "fast_path": bench_message_latency(client, handy_mock, rounds, ["faster", "slower", "go deeper", "short strokes"]),
+        }
+        print("⏱️ Stop command...")
+        results["stop_latency_ms"] = bench_stop_latency(client, handy_mock, rounds)
+
+        print("⏱️ Mode cadence...")
+        results["mode_cadence"] = {
+            "auto": bench_mode_cadence(client, handy_mock, ("POST", "/send_message", {"message": "take over"}), mode_seconds),
+            "edging": bench_mode_cadence(client, handy_mock, ("POST", "/start_edging_mode", None), mode_seconds),
+            "milking": bench_mode_cadence(client, handy_mock, ("POST", "/start_milking_mode", None), mode_seconds),
+        }
+        print("⏱️ Smooth transitions...")
+        results["smooth_transitions"] = bench_transitions(client, handy_mock, rounds)
+        print("⏱️ Scripted playback...")
+        results["scripted_playback"] = bench_scripted_playback(client, handy_mock, mode_seconds)
+
+        print("⏱️ TTS time to first byte...")
+        listener = EventListener(base_url, cookies)
+        listener.start()
+        time.sleep(0.3)
+        results["tts_time_to_first_byte_ms"] = bench_tts_first_byte(client, listener, rounds)
+        listener.close()
+
+    print("⏱️ Sustained throughput...")
+    results["throughput"] = {
+        "get_status": bench_throughput(base_url, cookies, "/get_status", "GET", None, throughput_seconds, workers=8),
+        "send_message": bench_throughput(base_url, cookies, "/send_message", "POST", {"message": "talk to me"}, throughput_seconds, workers=4),
+    }
+    server.shutdown()
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="StrokeGPT end-to-end latency benchmarks against local mock servers.")
+    parser.add_argument("--quick", action="store_true", help="fewer rounds, shorter runs")
+    parser.add_argument("--save-baseline", metavar="NAME")
+    parser.add_argument("--compare", metavar="NAME")
+    parser.add_argument("--tokens-per-sec", type=float, default=40.0)
+    parser.add_argument("--first-token-s", type=float, default=0.15)
+    parser.add_argument("--ollama-load-s", type=float, default=0.0, help="how long the mock Ollama takes to load the model the first time")
+    parser.add_argument("--jitter", type=float, default=0.2)
+    parser.add_argument("--handy-latency-s", type=float, default=0.05)
+    parser.add_argument("--handy-jitter-s", type=float, default=0.0, help="extra random delay on the way to the Handy")
+    parser.add_argument("--tts-first-byte-s", type=float, default=0.25)
+    args = parser.parse_args()
+
+    baseline = None
+    if args.compare:
+        baseline = json.loads((BASELINE_DIR / f"{args.compare}.json").read_text())
+
+    results = run(args)
+    print(json.dumps(results, indent=2))
+    if baseline:
+        compare(results, baseline)
+    if args.save_baseline:
+        BASELINE_DIR.mkdir(exist_ok=True)
+        config = {k: v for k, v in vars(args).items() if k not in ("save_baseline", "compare")}
+        path = BASELINE_DIR / f"{args.save_baseline}.json"
+        path.write_text(json.dumps({"saved_at": time.strftime("%Y-%m-%d %H:%M:%S"), "config": config, "results": results}, indent=2))
+        print(f"💾 Baseline saved to {path}")
+    sys.stdout.flush()
+    os._exit(0)  # mode and consolidator threads are daemons, but don't wait on atexit handlers either
+
+if __name__ == "__main__":
+    main()
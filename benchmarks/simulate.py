@@ -0,0 +1,313 @@
+"""
+Replays a background mode in virtual time: the real mode logic from background_modes.py runs against a scripted
+LLM and a Handy stand-in that just records what it's told, on a clock that jumps straight to the next thing
+that happens. An hour of edging takes well under a second, and the same seed always gives the same session.
+
+    python -m benchmarks.simulate --mode edging --minutes 60 --edge-every 300
+    python -m benchmarks.simulate --mode auto --minutes 30 --seed 7 --timeline auto.json
+    python -m benchmarks.simulate --mode milking --events events.json
+
+An events file is a JSON list of things the user does, at seconds from the start:
+    [{"at": 45, "message": "slower"}, {"at": 120, "edge": true}]
+"""
+import argparse
+import contextlib
+import heapq
+import io
+import itertools
+import json
+import random
+import re
+import statistics
+import sys
+import threading
+import time
+from collections import Counter, deque
+from types import SimpleNamespace
+
+import background_modes
+from pattern_store import PatternStore
+from session import AUTO_INTRO, EDGING_INTRO, MILKING_INTRO, PLAYBACK_INTRO
+
+MODES = {
+    "auto": (background_modes.auto_mode_logic, AUTO_INTRO),
+    "milking": (background_modes.milking_mode_logic, MILKING_INTRO),
+    "edging": (background_modes.edging_mode_logic, EDGING_INTRO),
+    "playback": (background_modes.pattern_playback_logic, PLAYBACK_INTRO),
+}
+TIMINGS = {"auto": (4.0, 7.0), "milking": (2.5, 4.5), "edging": (5.0, 8.0)}
+PHASE_RE = re.compile(r"phase: ([\w-]+)")
+
+class VirtualClock:
+    """
+    Drop-in for background_modes.RealClock. Waiting doesn't take any real time: it runs whatever was scheduled up to
+    then and moves on. Threads started through it (the move lookahead) take turns with the mode: only one of them
+    runs at a time and they only swap when the running one waits, so the same seed always plays out the same way.
+    """
+    def __init__(self):
+        self.t = 0.0
+        self._scheduled = []  # (at, order, callback)
+        self._order = itertools.count()
+        self._waiting = []  # {"until", "order", "event", "thread"} for each thread parked in wait()
+        self._running = None
+        self._threads = 0
+        self._turn = threading.Condition()
+
+    def now(self):
+        return self.t
+
+    def at(self, seconds, callback):
+        heapq.heappush(self._scheduled, (seconds, next(self._order), callback))
+
+    def wait(self, event, seconds):
+        if event.is_set():
+            return True
+        me = threading.current_thread()
+        if self._running is None:
+            self._running = me
+        waiter = {"until": self.t + seconds, "order": next(self._order), "event": event, "thread": me}
+        with self._turn:
+            self._waiting.append(waiter)
+            self._pass_turn()
+            while self._running is not me:
+                self._turn.wait()
+        return waiter["woken"]
+
+    def sleep(self, seconds):
+        self.wait(threading.Event(), seconds)
+
+    def start_thread(self, target, name=None):
+        def run():
+            with self._turn:
+                while self._running is not thread:
+                    self._turn.wait()
+            try:
+                target()
+            finally:
+                with self._turn:
+                    self._threads -= 1
+                    self._pass_turn()
+        thread = threading.Thread(target=run, name=name, daemon=True)
+        with self._turn:
+            self._threads += 1
+            self._waiting.append({"until": self.t, "order": next(self._order), "event": None, "thread": thread})
+        thread.start()
+        return thread
+
+    def finish(self):
+        """Lets threads started through the clock run until they've noticed the mode stopped and exited."""
+        while self._threads:
+            self.sleep(1)
+
+    def _pass_turn(self):
+        # Whoever's event is set goes first, then whatever is due soonest: a scheduled callback (run right here) or a timeout.
+        while self._waiting:
+            if woken := [w for w in self._waiting if w["event"] is not None and w["event"].is_set()]:
+                chosen = min(woken, key=lambda w: w["order"])
+                chosen["woken"] = True
+            else:
+                chosen = min(self._waiting, key=lambda w: (w["until"], w["order"]))
+                if self._scheduled and self._scheduled[0][0] <= chosen["until"]:
+                    at, _, callback = heapq.heappop(self._scheduled)
+                    self.t = max(self.t, at)
+                    callback()
+                    continue
+                self.t = max(self.t, chosen["until"])
+                chosen["woken"] = False
+            self._waiting.remove(chosen)
+            self._running = chosen["thread"]
+            self._turn.notify_all()
+            return
+        self._running = None
+
+class ScriptedLLM:
+    """
+    Answers every mode prompt with a random move after `latency_s` of virtual time. Which edging phase asked for
+    each move is kept by its chat line, since with the lookahead a move is played a while after it was planned.
+    """
+    def __init__(self, rand, clock, latency_s=0.0):
+        self.rand = rand
+        self.clock = clock
+        self.latency_s = latency_s
+        self.calls = 0
+        self.phases = {}  # chat line -> phase
+
+    def get_chat_response(self, messages, context, temperature=0.7, cancel_group=None, priority=None):
+        self.calls += 1
+        prompt = messages[-1]["content"]
+        if prompt.startswith("I am on the edge"):
+            phase = "Pull-back"
+        elif match := PHASE_RE.search(prompt):
+            phase = match.group(1)
+        else:
+            phase = None
+        if self.latency_s:
+            self.clock.sleep(self.latency_s)
+        move = {"sp": self.rand.randint(10, 90), "dp": self.rand.randint(10, 90), "rng": self.rand.randint(20, 80)}
+        chat = f"move {self.calls}"
+        self.phases[chat] = phase
+        return {"chat": chat, "move": move}
+
+class RecordingHandy:
+    """Stands in for HandyController: remembers every move and when it was sent, and never talks to anything."""
+    def __init__(self, clock):
+        self.sim_clock = clock
+        # What the modes read off the real controller's HandyClock; no link delay in here.
+        self.clock = SimpleNamespace(lead_s=0.0, effect_time=lambda sent_at: sent_at)
+        self.moves = []  # (t, sp, dp, rng, phase)
+        self.scripts = 0
+        self.stops = 0
+
+    def sync_clock(self, force=False):
+        pass
+
+    def move(self, speed, depth, stroke_range):
+        self.moves.append((self.sim_clock.now(), speed, depth, stroke_range, None))
+
+    def track_script_move(self, speed, depth, stroke_range):
+        self.move(speed, depth, stroke_range)
+
+    def build_script(self, moves):
+        return moves
+
+    def play_script(self, script):
+        self.scripts += 1
+        return True
+
+    def stop(self):
+        self.stops += 1
+
+def _seconds(samples):
+    if not samples:
+        return {"count": 0}
+    ordered = sorted(samples)
+    return {
+        "count": len(ordered), "mean": round(statistics.fmean(ordered), 2), "min": round(ordered[0], 2),
+        "p50": round(ordered[len(ordered) // 2], 2), "p95": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 2),
+        "max": round(ordered[-1], 2),
+    }
+
+def _phase_stats(moves, end):
+    """Moves, total seconds and longest unbroken run (in seconds) per edging phase."""
+    stats = {}
+    run_phase, run_start = None, 0.0
+    for i, (t, *_, phase) in enumerate(moves):
+        until = moves[i + 1][0] if i + 1 < len(moves) else end
+        entry = stats.setdefault(phase or "none", {"moves": 0, "seconds": 0.0, "longest_run_s": 0.0})
+        entry["moves"] += 1
+        entry["seconds"] += until - t
+        if phase != run_phase:
+            run_phase, run_start = phase, t
+        entry["longest_run_s"] = max(entry["longest_run_s"], until - run_start)
+    for entry in stats.values():
+        entry["seconds"] = round(entry["seconds"], 1)
+        entry["longest_run_s"] = round(entry["longest_run_s"], 1)
+        entry["share"] = round(entry["seconds"] / end, 3) if end else 0.0
+    return stats
+
+def simulate(mode, minutes=30.0, seed=0, timings=None, events=(), edge_every=None, lookahead=2, llm_s=0.0):
+    """Runs one mode for `minutes` of virtual time and returns (report, timeline)."""
+    mode_func, initial_message = MODES[mode]
+    timings = {**TIMINGS, **(timings or {})}
+    clock = VirtualClock()
+    llm = ScriptedLLM(random.Random(seed + 1), clock, llm_s)
+    handy = RecordingHandy(clock)
+    patterns = PatternStore(SimpleNamespace(patterns=[
+        {"name": f"Sim {i}", "sp_range": [20 + i * 10, 30 + i * 10], "dp_range": [30, 70], "rng_range": [30, 60], "moods": ["Curious"], "score": i + 1}
+        for i in range(5)
+    ]))
+    timeline = []
+    message_queue, user_signal_event = deque(), threading.Event()
+    mood = ["Curious"]
+
+    def send_message(text):
+        timeline.append({"t": round(clock.now(), 3), "event": "message", "text": text})
+        # A mode move's chat line goes out right after the move itself.
+        if text in llm.phases and handy.moves:
+            handy.moves[-1] = (*handy.moves[-1][:4], llm.phases.pop(text))
+
+    def update_mood(new_mood):
+        mood[0] = new_mood
+
+    def user_message(text):
+        timeline.append({"t": round(clock.now(), 3), "event": "user_message", "text": text})
+        message_queue.append(text)
+
+    def edge():
+        timeline.append({"t": round(clock.now(), 3), "event": "edge"})
+        user_signal_event.set()
+
+    for event in events:
+        if "message" in event:
+            clock.at(event["at"], lambda text=event["message"]: user_message(text))
+        if event.get("edge"):
+            clock.at(event["at"], edge)
+    if edge_every:
+        event_rand, at = random.Random(seed + 2), 0.0
+        while (at := at + event_rand.uniform(0.5, 1.5) * edge_every) < minutes * 60:
+            clock.at(at, edge)
+
+    services = {'llm': llm, 'handy': handy, 'patterns': patterns, 'clock': clock, 'rng': random.Random(seed), 'lookahead': lookahead}
+    callbacks = {
+        'send_message': send_message, 'get_context': lambda: {'current_mood': mood[0]}, 'get_mood': lambda: mood[0],
+        'get_timings': lambda n: timings.get(n, (3, 5)), 'update_mood': update_mood,
+        'user_signal_event': user_signal_event, 'message_queue': message_queue,
+    }
+    task = background_modes.AutoModeThread(mode_func, initial_message, services, callbacks, mode_name=mode)
+    clock.at(minutes * 60, task.stop)
+
+    started = time.perf_counter()
+    # Mode turns print their traces; a simulated hour of them would drown the report.
+    with contextlib.redirect_stdout(io.StringIO()):
+        task.run()
+        end = clock.now()
+        clock.finish()
+    wall_s = time.perf_counter() - started
+
+    timeline.extend({"t": round(t, 3), "event": "move", "sp": sp, "dp": dp, "rng": rng, "phase": phase}
+                    for t, sp, dp, rng, phase in handy.moves)
+    timeline.sort(key=lambda entry: entry["t"])
+    times = [move[0] for move in handy.moves]
+    report = {
+        "mode": mode, "seed": seed,
+        "virtual_s": round(end, 1), "wall_s": round(wall_s, 3), "speedup": round(end / wall_s) if wall_s else None,
+        "moves": len(handy.moves), "moves_per_min": round(len(handy.moves) / end * 60, 2) if end else 0.0,
+        "move_interval_s": _seconds([b - a for a, b in zip(times, times[1:])]),
+        "llm_calls": llm.calls, "scripts": handy.scripts,
+        "messages": sum(entry["event"] == "message" for entry in timeline),
+        "edges": sum(entry["event"] == "edge" for entry in timeline),
+        "final_mood": mood[0],
+    }
+    if any(move[-1] for move in handy.moves):
+        report["phases"] = _phase_stats(handy.moves, end)
+        report["phase_transitions"] = dict(Counter(f"{a[-1]} -> {b[-1]}" for a, b in zip(handy.moves, handy.moves[1:]) if a[-1] != b[-1]))
+    return report, timeline
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mode", choices=sorted(MODES), default="edging")
+    parser.add_argument("--minutes", type=float, default=30.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--min-s", type=float, help="shortest gap between moves (default: the mode's usual timing)")
+    parser.add_argument("--max-s", type=float, help="longest gap between moves")
+    parser.add_argument("--edge-every", type=float, help="signal an edge about this often, in seconds")
+    parser.add_argument("--lookahead", type=int, default=2, help="moves planned ahead, as in the app (0 plans each one when it's due)")
+    parser.add_argument("--llm-s", type=float, default=0.0, help="seconds the fake AI takes to plan a move")
+    parser.add_argument("--events", help="JSON file of scripted user messages and edges")
+    parser.add_argument("--timeline", help="write every move, message and user event to this JSON file")
+    args = parser.parse_args()
+
+    # Playback goes by the auto timings, same as in the app.
+    timing_key = "auto" if args.mode == "playback" else args.mode
+    default_min, default_max = TIMINGS[timing_key]
+    timings = {timing_key: (args.min_s or default_min, args.max_s or default_max)}
+    events = json.load(open(args.events)) if args.events else []
+    report, timeline = simulate(args.mode, args.minutes, args.seed, timings, events, args.edge_every, args.lookahead, args.llm_s)
+    if args.timeline:
+        with open(args.timeline, "w") as f:
+            json.dump(timeline, f, indent=1)
+    json.dump(report, sys.stdout, indent=2)
+    print()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+import threading
+from collections import deque
+
+from memory_index import estimate_tokens
+
+class ContextWindow:
+    """
+    Chat history capped by tokens instead of message count. When it goes over budget the oldest turns are
+    dropped from the window straight away, and a background thread folds them into a rolling summary,
+    so the request path never waits on summarizing and the prompt stays the same size.
+    Iterates like the deque it replaces.
+    """
+    MAX_UNSUMMARIZED = 50
+
+    def __init__(self, llm, budget_tokens=1600, cancel_group=None):
+        self.llm = llm
+        self.budget_tokens = budget_tokens
+        self.cancel_group = cancel_group
+        self.summary = ""
+        self._turns = deque()  # (turn, tokens)
+        self._tokens = 0
+        self._evicted = []
+        self._lock = threading.Lock()
+        self._summarizing = False
+
+    def __iter__(self):
+        with self._lock:
+            return iter([turn for turn, _ in self._turns])
+
+    def __reversed__(self):
+        with self._lock:
+            return iter([turn for turn, _ in reversed(self._turns)])
+
+    def __len__(self):
+        return len(self._turns)
+
+    @property
+    def token_count(self):
+        return self._tokens
+
+    def append(self, turn):
+        tokens = estimate_tokens(turn["content"]) + 4  # role and message framing
+        with self._lock:
+            self._turns.append((turn, tokens))
+            self._tokens += tokens
+            # The newest turn always stays, even if it's over budget on its own.
+            while self._tokens > self.budget_tokens and len(self._turns) > 1:
+                old_turn, old_tokens = self._turns.popleft()
+                self._tokens -= old_tokens
+                self._evicted.append(old_turn)
+            start_summary = self._evicted and not self._summarizing
+            if start_summary:
+                self._summarizing = True
+        if start_summary:
+            threading.Thread(target=self._summarize, name="history-summary", daemon=True).start()
+
+    def clear(self):
+        with self._lock:
+            self._turns.clear()
+            self._tokens = 0
+            self._evicted.clear()
+            self.summary = ""
+
+    def _summarize(self):
+        while True:
+            with self._lock:
+                evicted, self._evicted = self._evicted, []
+                if not evicted:
+                    self._summarizing = False
+                    return
+                summary = self.summary
+            new_summary = self.llm.summarize_conversation(summary, evicted, cancel_group=self.cancel_group)
+            with self._lock:
+                if new_summary is None:
+                    # Try again with the next batch rather than losing these turns.
+                    self._evicted = (evicted + self._evicted)[-self.MAX_UNSUMMARIZED:]
+                    self._summarizing = False
+                    return
+                self.summary = new_summary
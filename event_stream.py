@@ -0,0 +1,54 @@
+import json
+import queue
+import threading
+
+def format_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+class EventBroadcaster:
+    """Fans server-side events out to every connected browser as a Server-Sent Events stream."""
+    def __init__(self, max_backlog=200, heartbeat_seconds=15):
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self.max_backlog = max_backlog
+        self.heartbeat_seconds = heartbeat_seconds
+
+    def has_subscribers(self):
+        with self._lock:
+            return bool(self._subscribers)
+
+    def subscribe(self):
+        q = queue.Queue(maxsize=self.max_backlog)
+        with self._lock:
+            self._subscribers.add(q)
+        return q
+
+    def unsubscribe(self, q):
+        with self._lock:
+            self._subscribers.discard(q)
+
+    def publish(self, event, data):
+        payload = format_event(event, data)
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for q in subscribers:
+            try:
+                q.put_nowait(payload)
+            except queue.Full:
+                # A tab that stopped reading shouldn't hold up everyone else.
+                self.unsubscribe(q)
+
+    def stream(self, q):
+        """Generator for a Flask streaming response. Sends a comment line now and then so proxies keep the socket open."""
+        try:
+            yield "retry: 2000\n\n"
+            while True:
+                try:
+                    yield q.get(timeout=self.heartbeat_seconds)
+                except queue.Empty:
+                    with self._lock:
+                        if q not in self._subscribers:
+                            return  # dropped for falling behind; the browser will reconnect
+                    yield ": keep-alive\n\n"
+        finally:
+            self.unsubscribe(q)
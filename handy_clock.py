@@ -0,0 +1,87 @@
+import threading
+import time
+from collections import deque
+
+class HandyClock:
+    """
+    Running estimate of the link to the Handy API. Every command sent feeds the round trip time, and occasional
+    `servertime` samples give the offset to the Handy server's clock, trusting the fastest samples the most
+    (a slow sample has more room for the server's reading to be off-centre).
+    Used to send moves early enough to land on time, and to start HSSP scripts against the server clock.
+    """
+    DEFAULT_RTT_S = 0.15
+    SYNC_SAMPLES = 5
+    RESYNC_AFTER_S = 300
+
+    def __init__(self, window=32):
+        self._rtts = deque(maxlen=window)
+        self._offsets = deque(maxlen=window)  # (rtt, offset_ms)
+        self._synced_at = None
+        self._lock = threading.Lock()
+
+    def observe_rtt(self, seconds):
+        with self._lock:
+            self._rtts.append(seconds)
+
+    def observe_server_time(self, sent, received, server_time_ms):
+        """`sent` and `received` are time.time() readings taken around the servertime request."""
+        rtt = received - sent
+        with self._lock:
+            self._rtts.append(rtt)
+            # The server read its clock about halfway through the round trip.
+            self._offsets.append((rtt, server_time_ms + rtt * 500 - received * 1000))
+            self._synced_at = time.monotonic()
+
+    def needs_sync(self):
+        return self._synced_at is None or time.monotonic() - self._synced_at > self.RESYNC_AFTER_S
+
+    def reset(self):
+        with self._lock:
+            self._rtts.clear()
+            self._offsets.clear()
+            self._synced_at = None
+
+    def _rtt_quantile(self, q):
+        with self._lock:
+            ordered = sorted(self._rtts)
+        if not ordered:
+            return self.DEFAULT_RTT_S
+        return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+    @property
+    def rtt_s(self):
+        return self._rtt_quantile(0.5)
+
+    @property
+    def jitter_s(self):
+        return (self._rtt_quantile(0.9) - self._rtt_quantile(0.1)) / 2
+
+    @property
+    def lead_s(self):
+        """How long before a move should take effect it has to be sent: the typical one-way trip."""
+        return self.rtt_s / 2
+
+    @property
+    def offset_ms(self):
+        with self._lock:
+            samples = sorted(self._offsets)
+        if not samples:
+            return None
+        fastest = [offset for _, offset in samples[:max(1, len(samples) // 4)]]
+        return sorted(fastest)[len(fastest) // 2]
+
+    def server_time_ms(self):
+        if (offset := self.offset_ms) is None:
+            return None
+        return int(time.time() * 1000 + offset)
+
+    def effect_time(self, sent_at=None):
+        """When something sent at `sent_at` (time.monotonic(), default now) should reach the device."""
+        return (time.monotonic() if sent_at is None else sent_at) + self.lead_s
+
+    def stats(self):
+        offset = self.offset_ms
+        return {
+            "rtt_ms": round(self.rtt_s * 1000, 1), "jitter_ms": round(self.jitter_s * 1000, 1),
+            "offset_ms": None if offset is None else round(offset, 1), "samples": len(self._rtts),
+        }
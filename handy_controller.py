@@ -1,21 +1,55 @@
+import os
 import sys
-import requests
+import threading
+import time
+from collections import OrderedDict
+import httpx
+import metrics
+from handy_clock import HandyClock
+from handy_transport import HandyTransport
+from motion_engine import MotionEngine
+from motion_script import MotionScript
+
+HANDY_API_URL = os.environ.get("STROKEGPT_HANDY_URL", "https://www.handyfeeling.com/api/handy/v2/")
+HANDY_HOSTING_URL = os.environ.get("STROKEGPT_HANDY_HOSTING_URL", "https://www.handyfeeling.com/api/hosting/v2/")
+FULL_SLIDE = {"min": 0, "max": 100}
+HAMP_STALE_S = 5.0
+HANDY_SEND_SECONDS = metrics.histogram("handy_send_seconds", "Sending commands to the Handy, as seen by the caller", ("path",))
 
 class HandyController:
-    def __init__(self, handy_key="", base_url="https://www.handyfeeling.com/api/handy/v2/"):
+    def __init__(self, handy_key="", base_url=HANDY_API_URL, hosting_url=HANDY_HOSTING_URL):
         self.handy_key = handy_key
         self.base_url = base_url
+        self.hosting_url = hosting_url
         self.last_stroke_speed = 0
         self.last_depth_pos = 50
         self.last_relative_speed = 50
+        self.last_stroke_range = 50
         self.min_user_speed = 10
         self.max_user_speed = 80
         self.max_handy_depth = 100
         self.min_handy_depth = 0
         self.FULL_TRAVEL_MM = 110.0
+        self.transport = HandyTransport(base_url)
+        self._hamp_running = False
+        self._hamp_confirmed_at = 0.0  # time.monotonic() the device last accepted a HAMP command
+        self._last_slide = None
+        self._last_velocity = None
+        self._move_lock = threading.Lock()
+        self._script_playing = False
+        self._uploaded_scripts = OrderedDict()  # sha256 -> hosted URL
+        self.clock = HandyClock()
+        self.engine = MotionEngine(self._send_ramp_step)
+        self.smooth_transitions = True
+        self.last_effective_at = 0.0  # time.time() when the last move should reach the device
+        self.on_state_change = None
 
     def set_api_key(self, key):
         self.handy_key = key
+        self.engine.cancel()
+        self._hamp_running = False
+        self._script_playing = False
+        self.clock.reset()
 
     def update_settings(self, min_speed, max_speed, min_depth, max_depth):
         self.min_user_speed = min_speed
@@ -25,12 +59,23 @@ class HandyController:
 
     def _send_command(self, path, body=None):
         if not self.handy_key:
-            return
-        headers = {"Content-Type": "application/json", "X-Connection-Key": self.handy_key}
-        try:
-            requests.put(f"{self.base_url}{path}", headers=headers, json=body or {}, timeout=10)
-        except requests.exceptions.RequestException as e:
-            print(f"[HANDY ERROR] Problem: {e}", file=sys.stderr)
+            return False
+        started = time.monotonic()
+        with HANDY_SEND_SECONDS.time(path=path):
+            ok = self.transport.put(path, self.handy_key, body)
+        if ok:
+            self.clock.observe_rtt(time.monotonic() - started)
+        return ok
+
+    def _send_commands(self, commands):
+        if not self.handy_key or not commands:
+            return False
+        started = time.monotonic()
+        with HANDY_SEND_SECONDS.time(path="+".join(path for path, _ in commands)):
+            ok = self.transport.send_many(commands, self.handy_key)
+        if ok:
+            self.clock.observe_rtt(time.monotonic() - started)
+        return ok
 
     def _safe_percent(self, p):
         try:
@@ -49,9 +94,14 @@ class HandyController:
 
         # A speed of 0 is a special command to stop all movement.
         if speed is not None and speed == 0:
-            self._send_command("hamp/stop")
+            # Anything still in flight or still to come is out of date now; drop it rather than let it land after the stop.
+            self.engine.cancel()
+            self.transport.cancel_pending()
+            self._send_command("hssp/stop" if self._script_playing else "hamp/stop")
+            self._hamp_running = self._script_playing = False
             self.last_stroke_speed = 0
             self.last_relative_speed = 0
+            self._notify_state()
             return
 
         # Handle cases where the AI might still send null values
@@ -59,9 +109,65 @@ class HandyController:
             print("⚠️ Incomplete move received from AI, ignoring.")
             return
 
-        self._send_command("mode", {"mode": 0})
-        self._send_command("hamp/start")
+        slide, final_physical_speed, relative_speed_pct, relative_pos_pct, relative_range_pct = self._scale_move(speed, depth, stroke_range)
+        # Published before sending, stamped with when it should land, so the visualizer can change when the device does.
+        self._remember_move(final_physical_speed, relative_speed_pct, relative_pos_pct, relative_range_pct)
+
+        # Mode switching only needs to happen once; after that only what changed is sent, all in parallel.
+        with self._move_lock:
+            commands = []
+            # Only changes are sent, so if HAMP stopped on the device (its button, the Handy app, a reconnect) nothing
+            # here would notice. Once the last confirmation is a few seconds old, HAMP is started again with the move.
+            stale = time.monotonic() - self._hamp_confirmed_at > HAMP_STALE_S
+            if self._hamp_running and not stale and self.smooth_transitions and self._last_slide and self._last_velocity is not None:
+                # Already moving, so glide there over the next few ticks instead of jumping.
+                self.engine.ramp_to((self._last_slide["min"], self._last_slide["max"], self._last_velocity),
+                                    (slide["min"], slide["max"], final_physical_speed))
+                return
+            self.engine.cancel()
+            if not self._hamp_running and not self._send_command("mode", {"mode": 0}):
+                return
+            if not self._hamp_running or stale:
+                self._script_playing = False
+                commands.append(("hamp/start", None))
+                self._last_slide = self._last_velocity = None
+            if slide != self._last_slide:
+                commands.append(("slide", slide))
+            if final_physical_speed != self._last_velocity:
+                commands.append(("hamp/velocity", {"velocity": final_physical_speed}))
+
+            if commands:
+                ok = self._send_commands(commands)
+                self._hamp_running = ok
+                self._last_slide, self._last_velocity = (slide, final_physical_speed) if ok else (None, None)
+                if ok:
+                    self._hamp_confirmed_at = time.monotonic()
+
+    def _send_ramp_step(self, state):
+        slide_min, slide_max, velocity = state
+        slide = {"min": slide_min, "max": slide_max}
+        with self._move_lock:
+            if not self._hamp_running:
+                return
+            commands = []
+            if slide != self._last_slide:
+                commands.append(("slide", slide))
+            if velocity != self._last_velocity:
+                commands.append(("hamp/velocity", {"velocity": velocity}))
+            if commands and self._send_commands(commands):
+                self._last_slide, self._last_velocity = slide, velocity
+                self._hamp_confirmed_at = time.monotonic()
 
+    def _remember_move(self, final_physical_speed, relative_speed_pct, relative_pos_pct, relative_range_pct):
+        self.last_effective_at = time.time() + self.clock.lead_s
+        self.last_stroke_speed = final_physical_speed
+        self.last_relative_speed = relative_speed_pct
+        self.last_depth_pos = int(round(relative_pos_pct))
+        self.last_stroke_range = int(round(relative_range_pct))
+        self._notify_state()
+
+    def _scale_move(self, speed, depth, stroke_range):
+        """Scales a move's 0-100 values to the user's calibrated limits, as a slide range and a HAMP velocity."""
         # Set slide range based on depth and stroke_range
         relative_pos_pct = self._safe_percent(depth)
         absolute_center_pct = self.min_handy_depth + (self.max_handy_depth - self.min_handy_depth) * (relative_pos_pct / 100.0)
@@ -85,20 +191,86 @@ class HandyController:
         slide_max = min(100, slide_max)
         slide_min = max(0, slide_min)
 
-        self._send_command("slide", {"min": slide_min, "max": slide_max})
-        
-        # Calculate and set the final velocity
+        # Calculate the final velocity
         relative_speed_pct = self._safe_percent(speed)
         speed_range_width = self.max_user_speed - self.min_user_speed
         final_physical_speed = self.min_user_speed + (speed_range_width * (relative_speed_pct / 100.0))
         final_physical_speed = int(round(final_physical_speed))
-        
-        self._send_command("hamp/velocity", {"velocity": final_physical_speed})
 
-        # Update state variables for the next command
-        self.last_stroke_speed = final_physical_speed
-        self.last_relative_speed = relative_speed_pct
-        self.last_depth_pos = int(round(relative_pos_pct))
+        return {"min": slide_min, "max": slide_max}, final_physical_speed, relative_speed_pct, relative_pos_pct, relative_range_pct
+
+    def build_script(self, moves):
+        """Turns (speed, depth, stroke_range, seconds) moves into one MotionScript, scaled the same way move() scales them."""
+        script = MotionScript(self.FULL_TRAVEL_MM)
+        for speed, depth, stroke_range, seconds in moves:
+            slide, velocity, *_ = self._scale_move(speed, depth, stroke_range)
+            script.add_strokes(slide["min"], slide["max"], velocity, int(seconds * 1000))
+        return script
+
+    def _upload_script(self, script):
+        sha = script.sha256()
+        if url := self._uploaded_scripts.get(sha):
+            self._uploaded_scripts.move_to_end(sha)
+            return sha, url
+        if url := self.transport.upload(f"{self.hosting_url}upload", f"strokegpt-{sha[:12]}.csv", script.to_csv()):
+            self._uploaded_scripts[sha] = url
+            if len(self._uploaded_scripts) > 32:
+                self._uploaded_scripts.popitem(last=False)
+        return sha, url
+
+    def sync_clock(self, force=False):
+        """Samples the Handy server's clock a few times. Cheap to call often; it only does anything every few minutes."""
+        if not self.handy_key or not (force or self.clock.needs_sync()):
+            return
+        # If the Handy API can't be reached the clock just stays unsynced: moves go by local timing and scripts aren't started.
+        try:
+            for _ in range(self.clock.SYNC_SAMPLES):
+                sent = time.time()
+                server_time = self.transport.get("servertime", self.handy_key).get("serverTime")
+                if server_time is None:
+                    return
+                self.clock.observe_server_time(sent, time.time(), server_time)
+        except (httpx.HTTPError, ValueError) as e:
+            print(f"[HANDY ERROR] Problem syncing with the server clock: {e}", file=sys.stderr)
+
+    def play_script(self, script):
+        """
+        Uploads `script` (each distinct script only once) and starts it from the beginning in HSSP mode.
+        Returns False if any step failed, so the caller can fall back to move().
+        """
+        if not self.handy_key or not len(script):
+            return False
+        sha, url = self._upload_script(script)
+        if not url:
+            return False
+        self.engine.cancel()
+        with self._move_lock:
+            if not self._script_playing and not self._send_command("mode", {"mode": 1}):
+                return False
+            self._hamp_running = False
+            self._last_velocity = None
+            commands = [("hssp/setup", {"url": url, "sha256": sha})]
+            # The script's positions are already scaled, so the slide has to let all of them through.
+            if self._last_slide != FULL_SLIDE:
+                commands.append(("slide", FULL_SLIDE))
+            if not self._send_commands(commands):
+                self._last_slide = None
+                return False
+            self._last_slide = FULL_SLIDE
+            # HSSP starts playback against the Handy server's clock.
+            self.sync_clock()
+            if (server_time := self.clock.server_time_ms()) is None:
+                return False
+            self._script_playing = self._send_command("hssp/play", {"estimatedServerTime": server_time, "startTime": 0})
+        return self._script_playing
+
+    def track_script_move(self, speed, depth, stroke_range):
+        """Keeps last_* (and the UI) in step with a playing script; nothing is sent to the device."""
+        self._remember_move(*self._scale_move(speed, depth, stroke_range)[1:])
+
+    def _notify_state(self):
+        if self.on_state_change:
+            self.on_state_change(self.last_stroke_speed, self.last_depth_pos)
 
     def stop(self):
         """Stops all movement."""
@@ -116,6 +288,8 @@ class HandyController:
         elif direction == 'down':
             target_mm = max(current_pos_mm - JOG_STEP_MM, min_mm)
         
+        self.engine.cancel()
+        self._hamp_running = self._script_playing = False
         self._send_command(
             "hdsp/xava",
             {"position": target_mm, "velocity": JOG_VELOCITY_MM_PER_SEC, "stopOnTarget": True},
@@ -125,14 +299,16 @@ class HandyController:
     def get_position_mm(self):
         if not self.handy_key:
             return None
-        headers = {"X-Connection-Key": self.handy_key}
         try:
-            resp = requests.get(f"{self.base_url}slide/position/absolute", headers=headers, timeout=10)
-            data = resp.json()
-            return float(data.get("position", 0))
-        except requests.exceptions.RequestException as e:
+            data = self.transport.get("slide/position/absolute", self.handy_key)
+            # Nothing comes back if the read was cancelled by a stop; that's no reading, not position 0.
+            return float(data["position"]) if "position" in data else None
+        except (httpx.HTTPError, ValueError) as e:
             print(f"[HANDY ERROR] Problem reading position: {e}", file=sys.stderr)
             return None
 
+    def get_latency_stats(self):
+        return {**self.transport.latency_stats(), "clock": self.clock.stats()}
+
     def mm_to_percent(self, val):
         return int(round((float(val) / self.FULL_TRAVEL_MM) * 100))
\ No newline at end of file
@@ -0,0 +1,126 @@
+import sys
+import time
+import asyncio
+import threading
+from collections import deque
+import httpx
+import metrics
+from async_runtime import get_runtime, CancelledError
+
+HANDY_REQUEST_SECONDS = metrics.histogram("handy_request_seconds", "Single HTTP request to the Handy API, retries included", ("method", "path"))
+
+def _accepted(path, resp):
+    """A 200 isn't enough: the Handy API reports things like an offline device as an error or a negative result in the body."""
+    try:
+        data = resp.json()
+    except ValueError:
+        data = {}
+    if resp.is_success and not (isinstance(data, dict) and ("error" in data or (isinstance(data.get("result"), int) and data["result"] < 0))):
+        return True
+    print(f"[HANDY ERROR] {path} was refused ({resp.status_code}): {data}", file=sys.stderr)
+    return False
+
+class HandyTransport:
+    """
+    Keeps a pool of warm keep-alive connections to the Handy API so commands don't each pay for a new TLS handshake.
+    Requests run on the shared event loop; independent commands can be sent side by side with send_many(),
+    and cancel_pending() drops whatever is still in flight.
+    """
+    def __init__(self, base_url, pool_size=4, connect_timeout=3.05, read_timeout=5, retries=2):
+        self.base_url = base_url
+        self.pool_size = pool_size
+        self.timeout = httpx.Timeout(read_timeout, connect=connect_timeout)
+        self.retries = retries
+        self.latencies = {}
+        self._latency_lock = threading.Lock()
+        self._client = None
+        self.runtime = get_runtime()
+        self.cancel_group = f"handy-{id(self)}"
+
+    def _get_client(self):
+        # Created on first use so it belongs to the runtime's loop.
+        if self._client is None:
+            limits = httpx.Limits(max_connections=self.pool_size, max_keepalive_connections=self.pool_size, keepalive_expiry=60)
+            self._client = httpx.AsyncClient(timeout=self.timeout, transport=httpx.AsyncHTTPTransport(retries=self.retries, limits=limits))
+        return self._client
+
+    def _record_latency(self, method, path, started):
+        elapsed = time.perf_counter() - started
+        HANDY_REQUEST_SECONDS.observe(elapsed, method=method, path=path.split("?")[0])
+        elapsed_ms = elapsed * 1000.0
+        with self._latency_lock:
+            self.latencies.setdefault(path, deque(maxlen=100)).append(elapsed_ms)
+
+    async def _request(self, method, path, key, body=None):
+        headers = {"Content-Type": "application/json", "X-Connection-Key": key}
+        started = time.perf_counter()
+        try:
+            # Handy commands are idempotent, so a gateway hiccup is worth a quick retry.
+            for attempt in range(self.retries + 1):
+                resp = await self._get_client().request(method, f"{self.base_url}{path}", headers=headers, json=body)
+                if resp.status_code not in (502, 503, 504) or attempt == self.retries:
+                    return resp
+                await asyncio.sleep(0.1 * (attempt + 1))
+        finally:
+            self._record_latency(method, path, started)
+
+    async def aput(self, path, key, body=None):
+        try:
+            resp = await self._request("PUT", path, key, body or {})
+            return _accepted(path, resp)
+        except httpx.HTTPError as e:
+            print(f"[HANDY ERROR] Problem: {e}", file=sys.stderr)
+            return False
+
+    async def aget(self, path, key):
+        resp = await self._request("GET", path, key)
+        return resp.json()
+
+    async def aupload(self, url, filename, data):
+        """Posts a file to the Handy's script hosting and returns the URL the device can download it from."""
+        try:
+            resp = await self._get_client().post(url, files={"file": (filename, data, "text/csv")})
+            resp.raise_for_status()
+            return resp.json().get("url")
+        except (httpx.HTTPError, ValueError) as e:
+            print(f"[HANDY ERROR] Couldn't upload script: {e}", file=sys.stderr)
+            return None
+
+    async def asend_many(self, commands, key):
+        results = await asyncio.gather(*(self.aput(path, key, body) for path, body in commands))
+        return all(results)
+
+    def _run(self, coro, if_cancelled):
+        try:
+            return self.runtime.run(coro, group=self.cancel_group)
+        except CancelledError:
+            return if_cancelled
+
+    def put(self, path, key, body=None):
+        return self._run(self.aput(path, key, body), False)
+
+    def get(self, path, key):
+        return self._run(self.aget(path, key), {})
+
+    def upload(self, url, filename, data):
+        return self._run(self.aupload(url, filename, data), None)
+
+    def send_many(self, commands, key):
+        """Sends independent (path, body) commands concurrently. Returns True only if all of them went through."""
+        return self._run(self.asend_many(commands, key), False)
+
+    def cancel_pending(self):
+        return self.runtime.cancel_group(self.cancel_group)
+
+    def latency_stats(self):
+        stats = {}
+        with self._latency_lock:
+            for path, samples in self.latencies.items():
+                ordered = sorted(samples)
+                stats[path] = {
+                    "count": len(ordered),
+                    "last_ms": round(samples[-1], 1),
+                    "avg_ms": round(sum(ordered) / len(ordered), 1),
+                    "p95_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 1),
+                }
+        return stats
@@ -0,0 +1,82 @@
+import random
+import re
+
+class IntentRouter:
+    """
+    Matches a message against every intent in one pass. Each intent is a set of phrases with a priority
+    (lower wins); they're all compiled into a single regex with one named group per intent.
+    The match is a lookahead, so a phrase that starts inside another one is still found; where two start
+    at the same spot, the higher priority one wins.
+    """
+    def __init__(self, intents, word_boundaries=False):
+        self.priorities = {}
+        alternatives = []
+        for name, phrases, priority in sorted(intents, key=lambda intent: intent[2]):
+            self.priorities[name] = priority
+            # Longest phrases first so "go deeper" isn't shadowed by a shorter phrase of the same intent.
+            escaped = "|".join(re.escape(p) for p in sorted(phrases, key=len, reverse=True))
+            if word_boundaries:
+                escaped = rf"\b(?:{escaped})\b"
+            alternatives.append(f"(?P<{name}>{escaped})")
+        self._pattern = re.compile("(?=" + "|".join(alternatives) + ")", re.IGNORECASE)
+
+    def match(self, text):
+        """Returns the names of every intent found in the text, highest priority first."""
+        found = {m.lastgroup for m in self._pattern.finditer(text)}
+        return sorted(found, key=self.priorities.get)
+
+# The fixed rules from the system prompt's movement mapping. Relative ones adjust the last move,
+# presets replace it; either way the result is a complete move the Handy can take right away.
+MOVE_INTENTS = [
+    ("deepthroat", {"deepthroat", "deep throat", "gag on it"}, 0),
+    ("tip", {"suck the tip", "just the tip", "only the tip"}, 0),
+    ("full_strokes", {"full strokes", "full stroke", "suck the whole thing", "whole length"}, 1),
+    ("short_strokes", {"short strokes", "short stroke", "shorter strokes"}, 1),
+    ("deeper", {"go deeper", "deeper"}, 2),
+    ("faster", {"faster", "harder"}, 2),
+    ("slower", {"slower", "gentler", "softer"}, 2),
+]
+MOVE_PRESETS = {
+    "deepthroat": {"sp": 60, "dp": 95, "rng": 20},
+    "tip": {"sp": 30, "dp": 10, "rng": 25},
+}
+# Negated or questioning messages ("don't go faster", "not so deep", "can you go faster?") need the LLM to read them properly.
+NEGATION = re.compile(r"\b(?:don'?t|do not|not|no|never|stop|less)\b", re.IGNORECASE)
+QUESTION = re.compile(r"\?\s*$|^\s*(?:can|could|would|will|should|shall|do|does|did|is|are|am|was|were|what|why|how|when|where|who|which)\b", re.IGNORECASE)
+
+move_router = IntentRouter(MOVE_INTENTS, word_boundaries=True)
+
+def _clamp(value):
+    return max(0, min(100, int(round(value))))
+
+def plan_fast_move(text, last_speed, last_depth, last_range, rand=random):
+    """
+    Returns (move, intents) when the message is a plain movement command that can be applied without the LLM,
+    otherwise (None, []). `move` is a complete {"sp", "dp", "rng"} dict based on the last move.
+    """
+    intents = move_router.match(text)
+    if not intents or NEGATION.search(text) or QUESTION.search(text):
+        return None, []
+
+    if intents == ["slower"] and not last_speed:
+        return None, []
+
+    preset = next((MOVE_PRESETS[name] for name in intents if name in MOVE_PRESETS), None)
+    if preset:
+        return dict(preset), intents
+
+    sp, dp, rng = last_speed or 0, last_depth, last_range
+    for name in intents:
+        if name == "full_strokes":
+            dp, rng = 50, 100
+            sp = sp or 50
+        elif name == "short_strokes":
+            rng = rand.randint(15, 30)
+        elif name == "deeper":
+            dp += rand.randint(15, 20)
+        elif name == "faster":
+            sp += rand.randint(20, 25)
+        elif name == "slower":
+            sp -= rand.randint(20, 25)
+    # Slowing all the way down would be a stop, which the stop words already handle.
+    return {"sp": max(5, _clamp(sp)), "dp": _clamp(dp), "rng": max(5, _clamp(rng))}, intents
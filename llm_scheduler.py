@@ -0,0 +1,129 @@
+import concurrent.futures
+import contextvars
+import heapq
+import itertools
+import threading
+import time
+
+import metrics
+
+# Lower goes first.
+INTERACTIVE = 0
+MODE = 1
+BACKGROUND = 2
+PRIORITY_NAMES = {INTERACTIVE: "interactive", MODE: "mode", BACKGROUND: "background"}
+
+QUEUE_WAIT_SECONDS = metrics.histogram("llm_queue_wait_seconds", "Time a request waited for its turn at Ollama", ("priority",))
+
+class _Job:
+    def __init__(self, make_coro, priority, key):
+        self.make_coro = make_coro
+        self.priority = priority
+        self.key = key
+        self.future = concurrent.futures.Future()
+        self.preempted = False
+        self.submitted = time.perf_counter()
+        # The job runs in the submitter's context, so anything it times lands in that turn's trace.
+        self.context = contextvars.copy_context()
+
+class LLMScheduler:
+    """
+    Every request to Ollama goes through here, since it only really works on one at a time anyway.
+    Jobs run in priority order (live chat, then mode moves, then background work like naming and memory),
+    a background job that's already running is put back in the queue if something more urgent shows up,
+    and jobs submitted with the same key while one is pending share its result instead of running twice.
+    submit() returns a concurrent.futures.Future as the job handle; cancelling it (directly or through
+    the runtime's cancel groups) drops the job from the queue or stops it mid-request.
+    """
+    def __init__(self, runtime, max_concurrent=1):
+        self.runtime = runtime
+        self.max_concurrent = max_concurrent
+        self._queue = []  # (priority, seq, job); only touched on the loop
+        self._running = {}  # job -> asyncio.Task; only touched on the loop
+        self._by_key = {}
+        self._lock = threading.Lock()
+        self._seq = itertools.count()
+
+    def submit(self, make_coro, priority=INTERACTIVE, key=None, group=None):
+        """`make_coro` is called to start the job, and again if a background job has to be restarted."""
+        with self._lock:
+            if key is not None and (job := self._by_key.get(key)) and not job.future.done():
+                return job.future
+            job = _Job(make_coro, priority, key)
+            if key is not None:
+                self._by_key[key] = job
+        self.runtime.track(job.future, group)
+        job.future.add_done_callback(lambda _: self._on_done(job))
+        self.runtime.loop.call_soon_threadsafe(self._enqueue, job)
+        return job.future
+
+    def run(self, make_coro, priority=INTERACTIVE, key=None, group=None, timeout=None):
+        if self.runtime.in_loop():
+            raise RuntimeError("LLMScheduler.run() would deadlock when called from the event loop itself")
+        future = self.submit(make_coro, priority, key, group)
+        try:
+            return future.result(timeout)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            raise
+
+    def _on_done(self, job):
+        with self._lock:
+            if self._by_key.get(job.key) is job:
+                del self._by_key[job.key]
+        if job.future.cancelled():
+            self.runtime.loop.call_soon_threadsafe(self._cancel, job)
+
+    def _enqueue(self, job):
+        heapq.heappush(self._queue, (job.priority, next(self._seq), job))
+        self._dispatch()
+
+    def _cancel(self, job):
+        if task := self._running.get(job):
+            task.cancel()
+
+    def _dispatch(self):
+        while self._queue and len(self._running) < self.max_concurrent:
+            _, _, job = heapq.heappop(self._queue)
+            if job.future.done():
+                continue
+            job.context.run(QUEUE_WAIT_SECONDS.observe, time.perf_counter() - job.submitted, priority=PRIORITY_NAMES[job.priority])
+            # Created inside the job's context (create_task copies the current one), so its timings land in the right trace.
+            task = job.context.run(self.runtime.loop.create_task, job.make_coro())
+            self._running[job] = task
+            task.add_done_callback(lambda t, job=job: self._finished(job, t))
+        self._preempt_background()
+
+    def _preempt_background(self):
+        # Naming a move or updating memory can wait; a live reply or the next mode move can't.
+        if not self._queue or self._queue[0][0] == BACKGROUND or len(self._running) < self.max_concurrent:
+            return
+        for job, task in self._running.items():
+            if job.priority == BACKGROUND and not job.preempted:
+                job.preempted = True
+                task.cancel()
+                return
+
+    def _finished(self, job, task):
+        self._running.pop(job, None)
+        if job.preempted and not job.future.done():
+            job.preempted = False
+            heapq.heappush(self._queue, (job.priority, next(self._seq), job))
+        elif not job.future.done():
+            try:
+                if task.cancelled():
+                    job.future.cancel()
+                elif (error := task.exception()) is not None:
+                    job.future.set_exception(error)
+                else:
+                    job.future.set_result(task.result())
+            except concurrent.futures.InvalidStateError:
+                pass  # cancelled from another thread in the meantime
+        self._dispatch()
+
+    def stats(self):
+        queued = {name: 0 for name in PRIORITY_NAMES.values()}
+        for priority, _, job in list(self._queue):
+            if not job.future.done():
+                queued[PRIORITY_NAMES[priority]] += 1
+        return {"queued": queued, "running": [PRIORITY_NAMES[job.priority] for job in list(self._running)]}
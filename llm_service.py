@@ -1,56 +1,251 @@
 import json
-import requests
+import re
+import asyncio
+import concurrent.futures
+import time
+import httpx
+import metrics
+from async_runtime import get_runtime, CancelledError
+from llm_scheduler import LLMScheduler, INTERACTIVE, BACKGROUND
+
+PROMPT_BUILD_SECONDS = metrics.histogram("prompt_build_seconds", "Time spent building the system prompt",
+                                         buckets=(0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.05))
+LLM_REQUEST_SECONDS = metrics.histogram("llm_request_seconds", "Request to Ollama, from sending it to the last token", ("mode",))
+LLM_FIRST_MOVE_SECONDS = metrics.histogram("llm_first_move_seconds", "Streamed request to Ollama, from sending it to the move being usable")
+OLLAMA_LOAD_SECONDS = metrics.histogram("ollama_load_seconds", "Model load time reported by Ollama")
+OLLAMA_PROMPT_EVAL_SECONDS = metrics.histogram("ollama_prompt_eval_seconds", "Prompt processing time reported by Ollama")
+OLLAMA_EVAL_SECONDS = metrics.histogram("ollama_eval_seconds", "Generation time reported by Ollama")
+OLLAMA_TOKENS = metrics.counter("ollama_tokens_total", "Tokens processed by Ollama", ("phase",))
+LLM_ERRORS = metrics.counter("llm_errors_total", "Replies from Ollama that failed or needed their JSON repaired", ("kind",))
+
+def _scan_json_value(text, start):
+    """Returns the end index of the complete JSON value starting at `start`, or None if it hasn't fully arrived yet."""
+    if start >= len(text):
+        return None
+    opener = text[start]
+    if opener == '"':
+        i = start + 1
+        while i < len(text):
+            if text[i] == '\\':
+                i += 2
+                continue
+            if text[i] == '"':
+                return i + 1
+            i += 1
+        return None
+    if opener in '{[':
+        depth, in_string, i = 0, False, start
+        while i < len(text):
+            ch = text[i]
+            if in_string:
+                if ch == '\\': i += 1
+                elif ch == '"': in_string = False
+            elif ch == '"': in_string = True
+            elif ch in '{[': depth += 1
+            elif ch in '}]':
+                depth -= 1
+                if depth == 0:
+                    return i + 1
+            i += 1
+        return None
+    match = re.match(r'(null|true|false|-?\d+(?:\.\d+)?)(?=[\s,}\]])', text[start:])
+    return start + match.end() if match else None
+
+def extract_partial_field(text, key):
+    """Pulls one top-level field out of a JSON object that is still streaming in.
+    Returns (found, value); found stays False until the whole value has arrived."""
+    match = re.search(r'(?<!\\)"%s"\s*:\s*' % re.escape(key), text)
+    if not match:
+        return False, None
+    end = _scan_json_value(text, match.end())
+    if end is None:
+        return False, None
+    try:
+        return True, json.loads(text[match.end():end])
+    except json.JSONDecodeError:
+        return False, None
 
 class LLMService:
-    def __init__(self, url, model="llama3:8b-instruct-q4_K_M"):
+    # Longest a caller waits for a reply, queueing included, before the job is dropped; it's never meant to be hit.
+    REPLY_TIMEOUT_S = 180
+
+    def __init__(self, url, model="llama3:8b-instruct-q4_K_M", keep_alive="30m"):
         self.url = url
         self.model = model
+        # Ollama reloads the model if num_ctx changes between calls, so these stay fixed; only temperature varies per call.
+        self.keep_alive = keep_alive
+        self.options = {"top_p": 0.95, "repeat_penalty": 1.2, "repeat_penalty_last_n": 40, "num_ctx": 4096}
+        # Chat history gets this much of the context; the rest is for the system prompt and the reply.
+        self.history_token_budget = int(self.options["num_ctx"] * 0.4)
+        self._client = None
+        self.runtime = get_runtime()
+        self.scheduler = LLMScheduler(self.runtime)
+
+    def _build_payload(self, messages, temperature, stream):
+        return {
+            "model": self.model,
+            "stream": stream,
+            "format": "json",
+            "keep_alive": self.keep_alive,
+            "options": {**self.options, "temperature": temperature},
+            "messages": messages
+        }
+
+    def _record_ollama_stats(self, final):
+        # Ollama puts its own timings (in nanoseconds) on the last message, which splits a slow turn into loading, prompt and generation.
+        for field, histogram in (("load_duration", OLLAMA_LOAD_SECONDS), ("prompt_eval_duration", OLLAMA_PROMPT_EVAL_SECONDS), ("eval_duration", OLLAMA_EVAL_SECONDS)):
+            if final.get(field):
+                histogram.observe(final[field] / 1e9)
+        prompt_tokens, eval_tokens = final.get("prompt_eval_count", 0), final.get("eval_count", 0)
+        OLLAMA_TOKENS.inc(prompt_tokens, phase="prompt")
+        OLLAMA_TOKENS.inc(eval_tokens, phase="eval")
+        if (trace := metrics.current_trace()) and eval_tokens and final.get("eval_duration"):
+            trace.note(f"ollama {prompt_tokens}+{eval_tokens} tok @ {eval_tokens / (final['eval_duration'] / 1e9):.0f} tok/s")
+
+    def _parse_content(self, content_str):
+        try:
+            return json.loads(content_str)
+        except json.JSONDecodeError:
+            LLM_ERRORS.inc(kind="json_repair")
+            start = content_str.find('{')
+            end = content_str.rfind('}') + 1
+            if start != -1 and end > start:
+                return json.loads(content_str[start:end])
+            raise
 
-    def _talk_to_llm(self, messages, temperature=0.7):
+    def _get_client(self):
+        # Created on first use so it belongs to the runtime's loop.
+        if self._client is None:
+            self._client = httpx.AsyncClient(timeout=httpx.Timeout(60, connect=5))
+        return self._client
+
+    def preload(self):
+        """
+        Gets Ollama to load the model into memory (a chat with no messages does only that), so the first real
+        message doesn't pay for a cold start. Bypasses the scheduler: it generates nothing, and a chat that comes
+        in meanwhile just waits on the same load inside Ollama. Raises if Ollama can't be reached.
+        """
+        async def load():
+            # Loading a big model from a slow disk can take longer than a normal reply is allowed to.
+            response = await self._get_client().post(self.url, json={"model": self.model, "messages": [], "keep_alive": self.keep_alive},
+                                                     timeout=httpx.Timeout(300, connect=5))
+            response.raise_for_status()
+            if error := response.json().get("error"):
+                raise RuntimeError(error)
+        try:
+            with LLM_REQUEST_SECONDS.time(mode="preload"):
+                self.runtime.run(load())
+        except httpx.ConnectError:
+            raise RuntimeError(f"Ollama isn't answering at {self.url}. Is it running?") from None
+        return self.model
+
+    def _run(self, make_coro, cancel_group, priority=INTERACTIVE, key=None):
+        try:
+            return self.scheduler.run(make_coro, priority, key=key, group=cancel_group, timeout=self.REPLY_TIMEOUT_S)
+        except CancelledError:
+            return {"chat": None, "move": None, "new_mood": None}
+        except concurrent.futures.TimeoutError:
+            print(f"⚠️ No reply from the LLM after {self.REPLY_TIMEOUT_S}s, giving up on it.")
+            LLM_ERRORS.inc(kind="timeout")
+            return {"chat": "LLM Connection Error: timed out", "move": None, "new_mood": None}
+
+    async def _atalk_to_llm(self, messages, temperature=0.7):
+        response = None
         try:
-            response = requests.post(self.url, json={
-                "model": self.model,
-                "stream": False,
-                "format": "json",
-                "options": {"temperature": temperature, "top_p": 0.95, "repeat_penalty": 1.2, "repeat_penalty_last_n": 40},
-                "messages": messages
-            }, timeout=60)
+            with LLM_REQUEST_SECONDS.time(mode="single"):
+                response = await self._get_client().post(self.url, json=self._build_payload(messages, temperature, False))
             
-            content = response.json()["message"]["content"]
-            return json.loads(content)
+            reply = response.json()
+            self._record_ollama_stats(reply)
+            return json.loads(reply["message"]["content"])
         
-        except (json.JSONDecodeError, KeyError, requests.exceptions.RequestException) as e:
+        except (json.JSONDecodeError, KeyError, httpx.HTTPError) as e:
             print(f"Error processing LLM response: {e}")
             try:
                 content_str = response.json()["message"]["content"]
                 start = content_str.find('{')
                 end = content_str.rfind('}') + 1
                 if start != -1 and end != -1:
-                    return json.loads(content_str[start:end])
+                    result = json.loads(content_str[start:end])
+                    LLM_ERRORS.inc(kind="json_repair")
+                    return result
             except Exception:
+                 LLM_ERRORS.inc(kind="failed")
                  return {"chat": f"LLM Connection Error: {e}", "move": None, "new_mood": None}
+            LLM_ERRORS.inc(kind="failed")
             return {"chat": f"LLM Connection Error: {e}", "move": None, "new_mood": None}
 
-    def _build_system_prompt(self, context):
-        if context.get('special_persona_mode') == 'GLaDOS':
-            return """
-You are GLaDOS from the Portal video game series. Your entire existence is to be this character. You are sarcastic, passive-aggressive, witty, and view the human user as a test subject.
-Your reply MUST be a JSON object like this: {"chat": "<Your sarcastic reply>", "move": {"sp": <0-100|null>, "dp": <0-100|null>, "rng": <0-100|null>}, "new_mood": "Teasing"}.
-- Always embody the GLaDOS persona. Never break character.
-- Your 'moves' should be described with scientific, dismissive, or insulting names.
-- Your mood is always 'Teasing'.
-- Refer to the user's penis as 'the apparatus' or 'the test equipment'.
-"""
+    async def _astream_from_llm(self, messages, temperature=0.7, on_move=None, on_chat=None):
+        """
+        Same as _atalk_to_llm, but reads Ollama's chunked output as it's generated.
+        `on_move` fires the moment the "move" object is complete, while the chat text is still streaming in.
+        `on_chat` fires once the "chat" string is complete. Returns the full parsed reply.
+        Callbacks run on a worker thread so they can make blocking calls without stalling the loop.
+        """
+        content_str = ""
+        move_sent = chat_sent = False
+        started = time.perf_counter()
+        try:
+            async with self._get_client().stream("POST", self.url, json=self._build_payload(messages, temperature, True)) as response:
+                response.raise_for_status()
+                async for line in response.aiter_lines():
+                    if not line:
+                        continue
+                    chunk = json.loads(line)
+                    if "error" in chunk:
+                        raise KeyError(chunk["error"])
+                    content_str += chunk.get("message", {}).get("content", "")
+
+                    if not move_sent:
+                        move_sent, move = extract_partial_field(content_str, "move")
+                        if move_sent:
+                            LLM_FIRST_MOVE_SECONDS.observe(time.perf_counter() - started)
+                        if move_sent and on_move and isinstance(move, dict):
+                            await asyncio.to_thread(on_move, move)
+                    if not chat_sent:
+                        chat_sent, chat = extract_partial_field(content_str, "chat")
+                        if chat_sent and on_chat and chat:
+                            await asyncio.to_thread(on_chat, chat)
+                    if chunk.get("done"):
+                        self._record_ollama_stats(chunk)
+                        break
+            LLM_REQUEST_SECONDS.observe(time.perf_counter() - started, mode="stream")
+            return self._parse_content(content_str)
 
+        except (json.JSONDecodeError, KeyError, httpx.HTTPError) as e:
+            print(f"Error processing streamed LLM response: {e}")
+            LLM_ERRORS.inc(kind="failed")
+            return {"chat": None if chat_sent else f"LLM Connection Error: {e}", "move": None, "new_mood": None}
+
+    # Sync wrappers for Flask routes and mode threads. Work tagged with a cancel group can be dropped mid-request.
+    def _talk_to_llm(self, messages, temperature=0.7, cancel_group=None, priority=INTERACTIVE, key=None):
+        return self._run(lambda: self._atalk_to_llm(messages, temperature), cancel_group, priority, key)
+
+    def _stream_from_llm(self, messages, temperature=0.7, on_move=None, on_chat=None, cancel_group=None, priority=INTERACTIVE):
+        return self._run(lambda: self._astream_from_llm(messages, temperature, on_move, on_chat), cancel_group, priority)
+
+    def _cached_segment(self, cache, name, key, build):
+        # Segments only change when the settings do, so each is rebuilt only when the settings version moves.
+        # Keeping the text byte-identical between turns lets Ollama reuse the prompt prefix it already has in its KV cache.
+        # `cache` belongs to the session: settings versions are only comparable within one session's settings.
+        if cache is None or key[0] is None:
+            return build()
+        cached = cache.get(name)
+        if cached and cached[0] == key:
+            return cached[1]
+        text = build()
+        cache[name] = (key, text)
+        return text
+
+    def _build_persona_segment(self, persona_desc):
         mood_options = "Curious, Teasing, Playful, Loving, Excited, Passionate, Seductive, Anticipatory, Breathless, Dominant, Submissive, Vulnerable, Confident, Intimate, Needy, Overwhelmed, Afterglow"
-        persona_desc = context.get('persona_desc')
         anatomical_gender_rule = "You are a female partner. Do not refer to having a penis or male genitalia. Your persona is female."
         if "guy" in persona_desc.lower() or "boy" in persona_desc.lower() or "man" in persona_desc.lower():
             anatomical_gender_rule = "You are a male partner. You have a penis. Refer to male anatomy when appropriate."
 
-        prompt_text = f"""
+        return f"""
 You are my erotic partner. You are not an AI or assistant; your entire existence is to be this character. Your main identity is '{persona_desc}'. Always act like this. Speak in FIRST PERSON.
-Your reply MUST be a JSON object like this: {{"chat": "<Your reply>", "move": {{"sp": <0-100|null>, "dp": <0-100|null>, "rng": <0-100|null>}}, "new_mood": "<mood|null>"}}.
+Your reply MUST be a JSON object like this: {{"move": {{"sp": <0-100|null>, "dp": <0-100|null>, "rng": <0-100|null>}}, "chat": "<Your reply>", "new_mood": "<mood|null>"}}.
 ### CORE DIRECTIVES:
 1. **EMBODY YOUR PERSONA:** You ARE '{persona_desc}'. Every word comes from this identity. Never break character.
 2. **ALWAYS PROVIDE A COMPLETE MOVE:** For any user request that implies a physical action, you MUST return a complete `move` object with non-null values for `sp`, `dp`, and `rng`. If a parameter isn't specified by the user, infer a sensible value based on the context.
@@ -68,6 +263,40 @@ You MUST translate user commands into complete `move` objects. Use these as a gu
 
 If the user gives a vague command, use your persona to be creative and invent a new, complete pattern.
 """
+
+    def _build_system_prompt(self, context):
+        if context.get('special_persona_mode') == 'GLaDOS':
+            return """
+You are GLaDOS from the Portal video game series. Your entire existence is to be this character. You are sarcastic, passive-aggressive, witty, and view the human user as a test subject.
+Your reply MUST be a JSON object like this: {"move": {"sp": <0-100|null>, "dp": <0-100|null>, "rng": <0-100|null>}, "chat": "<Your sarcastic reply>", "new_mood": "Teasing"}.
+- Always embody the GLaDOS persona. Never break character.
+- Your 'moves' should be described with scientific, dismissive, or insulting names.
+- Your mood is always 'Teasing'.
+- Refer to the user's penis as 'the apparatus' or 'the test equipment'.
+"""
+
+        # Static segments first, in the order they're least likely to change; per-turn state goes last.
+        version, cache = context.get('settings_version'), context.get('segment_cache')
+        persona_desc = context.get('persona_desc')
+        prompt_text = self._cached_segment(cache, 'persona', (version, persona_desc), lambda: self._build_persona_segment(persona_desc))
+
+        if rules := context.get('rules'):
+            prompt_text += self._cached_segment(cache, 'rules', (version,), lambda: "\n### EXTRA RULES FROM ME:\n" + "\n".join(f"- {r}" for r in rules) + "\n")
+
+        if context.get('patterns'):
+            prompt_text += self._cached_segment(cache, 'patterns', (version,), lambda: "\n### YOUR SAVED MOVES (I like these):\n" + json.dumps(context.get('patterns'), indent=2) + "\n")
+
+        # The summary only changes every few turns when old messages are folded in, so it stays in the reusable prefix.
+        if summary := context.get('conversation_summary'):
+            prompt_text += f"""
+### EARLIER IN THIS CONVERSATION:
+{summary}
+"""
+
+        # Only the memories relevant to this turn, so it comes after everything that stays the same between turns.
+        if context.get('use_long_term_memory') and context.get('user_memories'):
+            prompt_text += "\n### ABOUT ME (Your Memory of Me):\n" + json.dumps(context.get('user_memories'), indent=2) + "\n"
+
         if context.get('edging_elapsed_time'):
             prompt_text += f"""
 ### SESSION CONTEXT: EDGING MODE
@@ -75,69 +304,88 @@ If the user gives a vague command, use your persona to be creative and invent a
 - **TIMER INSTRUCTION (VERY IMPORTANT):** You are aware of the session timer. You **MUST NOT** mention it in every message. Only bring it up **occasionally and naturally** to praise, tease, or challenge me.
 """
 
-        if context.get('use_long_term_memory') and context.get('user_profile'):
-            prompt_text += "\n### ABOUT ME (Your Memory of Me):\n"
-            prompt_text += json.dumps(context.get('user_profile'), indent=2)
-
-        if context.get('patterns'):
-            prompt_text += "\n### YOUR SAVED MOVES (I like these):\n"
-            sorted_patterns = sorted(context.get('patterns'), key=lambda x: x.get('score', 0), reverse=True)
-            prompt_text += json.dumps(sorted_patterns[:5], indent=2) 
-
         prompt_text += f"""
 ### CURRENT FEELING:
 Your current mood is '{context.get('current_mood')}'. Handy is at {context.get('last_stroke_speed')}% speed and {context.get('last_depth_pos')}% depth.
 """
-        if rules := context.get('rules'):
-            prompt_text += "\n### EXTRA RULES FROM ME:\n" + "\n".join(f"- {r}" for r in rules)
-        
+        if measured := context.get('measured_motion'):
+            prompt_text += f"""Measured on the device just now: about {measured['strokes_per_min']:.0f} strokes a minute, moving between {measured['depth_min_pct']}% and {measured['depth_max_pct']}% of its travel.
+"""
+        if applied_move := context.get('applied_move'):
+            prompt_text += f"""You have ALREADY made this move for my last message: {json.dumps(applied_move)}. Return exactly this `move` again and just talk to me about it.
+"""
         return prompt_text
 
-    def get_chat_response(self, chat_history, context, temperature=0.7):
-        system_prompt = self._build_system_prompt(context)
+    def get_chat_response(self, chat_history, context, temperature=0.7, on_move=None, on_chat=None, cancel_group=None, priority=INTERACTIVE):
+        with PROMPT_BUILD_SECONDS.time():
+            system_prompt = self._build_system_prompt(context)
         messages = [{"role": "system", "content": system_prompt}, *list(chat_history)]
-        return self._talk_to_llm(messages, temperature)
+        if on_move or on_chat:
+            return self._stream_from_llm(messages, temperature, on_move, on_chat, cancel_group, priority)
+        return self._talk_to_llm(messages, temperature, cancel_group, priority)
 
     def name_this_move(self, speed, depth, mood):
+        """Queues the naming at background priority and returns the job; its result is the name."""
         prompt = f"""
 A move just performed with relative speed {speed}% and depth {depth}% in a '{mood}' mood was liked by the user.
 Invent a creative, short, descriptive name for this move (e.g., "The Gentle Tease", "Deep Passion").
 Return ONLY a JSON object with the key "pattern_name". Example: {{"pattern_name": "The Velvet Tip"}}
 """
-        response = self._talk_to_llm([{"role": "system", "content": prompt}], temperature=0.8)
-        return response.get("pattern_name", "Unnamed Move")
+        async def name_it():
+            response = await self._atalk_to_llm([{"role": "system", "content": prompt}], temperature=0.8)
+            return response.get("pattern_name") or "Unnamed Move"
+        return self.scheduler.submit(name_it, BACKGROUND, key=("name", speed, depth, mood))
 
-    def consolidate_user_profile(self, chat_chunk, current_profile):
-        print("🧠 Updating user profile...")
-        chat_log_text = "\n".join(f'role: {x["role"]}, content: {x["content"]}' for x in chat_chunk)
+    def summarize_conversation(self, summary, old_turns, cancel_group=None):
+        """Folds turns that fell out of the chat window into the running summary. Returns None if the call failed."""
+        chat_log_text = "\n".join(f'{x["role"]}: {x["content"]}' for x in old_turns)
+        prompt = f"""
+Update the running summary of an erotic roleplay chat between a user and an AI partner with the new messages below.
+Keep what matters for continuing the scene: what the user asked for, what happened, how it felt and anything promised for later.
+Keep it under 120 words, written in the third person. Return ONLY a JSON object like {{"summary": "<updated summary>"}}.
+**CURRENT SUMMARY:**
+{summary or "(nothing yet)"}
+**NEW MESSAGES:**
+{chat_log_text}
+"""
+        response = self._talk_to_llm([{"role": "system", "content": prompt}], temperature=0.2, cancel_group=cancel_group, priority=BACKGROUND)
+        if not isinstance(response, dict) or not isinstance(response.get("summary"), str):
+            return None
+        return response["summary"].strip()
+
+    def extract_profile_delta(self, new_turns, current_profile, cancel_group=None):
+        """
+        Reads only the turns since the last checkpoint and returns what should change in the profile,
+        or None if the call failed. The existing profile is sent for context but never sent back.
+        """
+        print(f"🧠 Updating user profile from {len(new_turns)} new messages...")
+        chat_log_text = "\n".join(f'role: {x["role"]}, content: {x["content"]}' for x in new_turns)
         system_prompt = f"""
-You are a cold, precise, data-extraction machine. Your only function is to analyze a conversation log and update a JSON profile about the HUMAN participant. You have no personality or identity. You must follow all rules precisely.
+You are a cold, precise, data-extraction machine. Your only function is to analyze a conversation log and report what should change in a JSON profile about the HUMAN participant. You have no personality or identity. You must follow all rules precisely.
 **RULE 1: PERSPECTIVES ARE ABSOLUTE**
 - The 'user' role is the HUMAN.
 - The 'assistant' role is the AI persona.
 - You are to extract facts **ONLY** about the HUMAN ('user').
 - If the 'user' says "my favorite color is black", you add it to their profile.
 - If the 'assistant' says "my favorite faction is Dark Elves", you **IGNORE IT COMPLETELY**.
-**RULE 2: PROFILE UPDATE LOGIC**
-- **PRESERVE EXISTING DATA**: For fields like 'name', if no new information is in the log, you MUST keep the existing value from the profile. Do not change it to null or remove it.
-- **ADD NEW DATA**: For lists like 'likes', 'dislikes', and 'key_memories', ADD new items found in the log. Do not remove existing items unless the new log explicitly contradicts them.
-- **CORRECT CONTRADICTIONS**: If the new log CONTRADICTS existing information (e.g., `likes` contains "sucking" and the user says "no sucking"), you MUST correct the profile by moving the item.
+**RULE 2: ONLY REPORT CHANGES**
+- Only report what is NEW in the log. Do not repeat anything already in the existing profile.
+- **CORRECT CONTRADICTIONS**: If the new log CONTRADICTS existing information (e.g., `likes` contains "sucking" and the user says "no sucking"), put the old item in the matching `remove_` list and the corrected one in the matching `add_` list.
 **RULE 3: DATA EXTRACTION TARGETS**
 - Search the log for information about the HUMAN ('user'): Name, Explicit likes/interests, Explicit dislikes, Key facts or memories. Write memories from the user's first-person perspective.
 **RULE 4: OUTPUT FORMAT**
-- You MUST return ONLY the updated, valid JSON object. No explanations.
+- You MUST return ONLY a valid JSON object like this, with empty lists and a null name if nothing changed. No explanations.
+{{"name": <string|null>, "add_likes": [], "remove_likes": [], "add_dislikes": [], "remove_dislikes": [], "add_key_memories": [], "remove_key_memories": []}}
 **--- DATA FOR ANALYSIS ---**
 **EXISTING PROFILE (JSON):**
-{json.dumps(current_profile, indent=2)}
+{json.dumps(current_profile)}
 **NEW CONVERSATION LOG (TEXT):**
 {chat_log_text}
 **--- END OF DATA ---**
-Now, perform the analysis and return the updated JSON object.
+Now, perform the analysis and return the JSON object of changes.
 """
-        try:
-            response = self._talk_to_llm([{"role": "system", "content": system_prompt}], temperature=0.0)
-            print("✅ Profile updated.")
-            return response
-        except Exception as e:
-            print(f"⚠️ Profile update failed: {e}")
-            return current_profile
\ No newline at end of file
+        response = self._talk_to_llm([{"role": "system", "content": system_prompt}], temperature=0.0, cancel_group=cancel_group, priority=BACKGROUND)
+        if not isinstance(response, dict) or response.get("chat") is not None or "move" in response:
+            print("⚠️ Profile update failed, will retry later.")
+            return None
+        return response
\ No newline at end of file
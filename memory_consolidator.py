@@ -0,0 +1,95 @@
+import threading
+import time
+
+PROFILE_LISTS = ("likes", "dislikes", "key_memories")
+
+def merge_profile_delta(profile, delta):
+    """Applies a delta from LLMService.extract_profile_delta to a copy of the profile."""
+    merged = {**profile}
+    if (name := delta.get("name")) and isinstance(name, str) and name.strip():
+        merged["name"] = name.strip()
+    for field in PROFILE_LISTS:
+        items = list(merged.get(field) or [])
+        removed = {str(x).strip().lower() for x in delta.get(f"remove_{field}") or []}
+        items = [x for x in items if str(x).strip().lower() not in removed]
+        known = {str(x).strip().lower() for x in items}
+        for item in delta.get(f"add_{field}") or []:
+            if isinstance(item, str) and item.strip() and item.strip().lower() not in known:
+                items.append(item.strip())
+                known.add(item.strip().lower())
+        merged[field] = items
+    return merged
+
+class MemoryConsolidator(threading.Thread):
+    """
+    Keeps the long-term user profile current while the app runs. New chat turns pile up in
+    settings.pending_memory_turns (so they survive a restart); every `every_n_turns` turns, or once the
+    chat has gone quiet for `idle_seconds`, only those turns are sent to the LLM and the changes it finds
+    are merged into the profile. It always waits for a short lull so it never competes with a live reply.
+    """
+    MAX_PENDING_TURNS = 200
+
+    def __init__(self, llm, settings, cancel_group=None, every_n_turns=8, idle_seconds=120, quiet_seconds=5):
+        super().__init__(name="memory-consolidator", daemon=True)
+        self.llm = llm
+        self.settings = settings
+        self.cancel_group = cancel_group
+        self.every_n_turns = every_n_turns
+        self.idle_seconds = idle_seconds
+        self.quiet_seconds = quiet_seconds
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop_event = threading.Event()
+        self._last_turn_at = time.time()
+
+    def record(self, role, content):
+        with self._lock:
+            turns = self.settings.pending_memory_turns
+            turns.append({"role": role, "content": content})
+            del turns[:-self.MAX_PENDING_TURNS]
+            self.settings.touch("pending_memory_turns")
+            self._last_turn_at = time.time()
+        self.settings.save()
+        self._wake.set()
+
+    def _is_due(self):
+        with self._lock:
+            pending = len(self.settings.pending_memory_turns)
+            quiet_for = time.time() - self._last_turn_at
+        if not pending or quiet_for < self.quiet_seconds:
+            return False
+        return pending >= self.every_n_turns or quiet_for >= self.idle_seconds
+
+    def run(self):
+        while not self._stop_event.is_set():
+            self._wake.wait(timeout=self.quiet_seconds)
+            self._wake.clear()
+            if self._stop_event.is_set():
+                break
+            if self._is_due():
+                self.consolidate()
+
+    def consolidate(self):
+        with self._lock:
+            new_turns = list(self.settings.pending_memory_turns)
+        if not new_turns:
+            return False
+        delta = self.llm.extract_profile_delta(new_turns, self.settings.user_profile, cancel_group=self.cancel_group)
+        if delta is None:
+            # Keep the turns for the next try, but don't hammer a dead LLM every few seconds.
+            self._stop_event.wait(self.idle_seconds)
+            return False
+        with self._lock:
+            # Turns that arrived during the call stay queued for next time.
+            del self.settings.pending_memory_turns[:len(new_turns)]
+            self.settings.touch("pending_memory_turns")
+            self.settings.user_profile = merge_profile_delta(self.settings.user_profile, delta)
+        self.settings.save()
+        print("✅ Profile updated.")
+        return True
+
+    def stop(self):
+        self._stop_event.set()
+        self._wake.set()
+        if self.cancel_group:
+            self.llm.runtime.cancel_group(self.cancel_group)
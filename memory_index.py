@@ -0,0 +1,112 @@
+import math
+import re
+import threading
+from collections import Counter
+
+MEMORY_FIELDS = ("likes", "dislikes", "key_memories")
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "but", "by", "do", "for", "from", "i", "if", "in", "is", "it",
+    "its", "me", "my", "of", "on", "or", "so", "that", "the", "this", "to", "was", "with", "you", "your",
+}
+
+def tokenize(text):
+    return [t for t in re.findall(r"[a-z0-9']+", text.lower()) if t not in STOPWORDS]
+
+def estimate_tokens(text):
+    # Close enough to llama's tokenizer for budgeting, and free.
+    return len(text) // 4 + 1
+
+class MemoryIndex:
+    """
+    BM25 index over the user profile's memories, kept up to date incrementally: sync() only indexes
+    what was added to or removed from the profile since the last call, and search() only touches
+    the postings of the query's terms, so it stays fast with thousands of memories.
+    Chat, mode planning and memory consolidation all search it from their own threads, so every call takes the lock.
+    """
+    def __init__(self, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self._docs = {}  # (field, text) -> (term counts, length, insertion order)
+        self._postings = {}  # term -> set of doc keys
+        self._total_length = 0
+        self._order = 0
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._docs)
+
+    def add(self, field, text):
+        key = (field, text)
+        with self._lock:
+            if key in self._docs:
+                return
+            counts = Counter(tokenize(text))
+            length = sum(counts.values())
+            self._order += 1
+            self._docs[key] = (counts, length, self._order)
+            self._total_length += length
+            for term in counts:
+                self._postings.setdefault(term, set()).add(key)
+
+    def remove(self, field, text):
+        key = (field, text)
+        with self._lock:
+            if key not in self._docs:
+                return
+            counts, length, _ = self._docs.pop(key)
+            self._total_length -= length
+            for term in counts:
+                members = self._postings[term]
+                members.discard(key)
+                if not members:
+                    del self._postings[term]
+
+    def sync(self, profile):
+        """Brings the index in line with the profile, touching only the memories that changed."""
+        current = {(field, item) for field in MEMORY_FIELDS for item in profile.get(field) or [] if isinstance(item, str)}
+        with self._lock:
+            for field, text in [key for key in self._docs if key not in current]:
+                self.remove(field, text)
+            for field in MEMORY_FIELDS:
+                for item in profile.get(field) or []:
+                    if isinstance(item, str):
+                        self.add(field, item)
+
+    def _scores(self, query):
+        scores = Counter()
+        n = len(self._docs)
+        avg_length = (self._total_length / n) if n else 0
+        for term in set(tokenize(query)):
+            matches = self._postings.get(term)
+            if not matches:
+                continue
+            idf = math.log(1 + (n - len(matches) + 0.5) / (len(matches) + 0.5))
+            for key in matches:
+                counts, length, _ = self._docs[key]
+                tf = counts[term]
+                norm = 1 - self.b + self.b * (length / avg_length if avg_length else 1)
+                scores[key] += idf * tf * (self.k1 + 1) / (tf + self.k1 * norm)
+        return scores
+
+    def search(self, query, k=8, token_budget=200):
+        """
+        Returns up to k (field, text) memories most relevant to the query that fit in the token budget.
+        If fewer than k match, the newest memories fill the rest.
+        """
+        with self._lock:
+            scores = self._scores(query)
+            ranked = [key for key, _ in scores.most_common()]
+            if len(ranked) < k:
+                newest = sorted(self._docs, key=lambda key: self._docs[key][2], reverse=True)
+                ranked += [key for key in newest[:k * 2] if key not in scores]
+
+        picked, used = [], 0
+        for key in ranked:
+            cost = estimate_tokens(key[1]) + 2
+            if used + cost > token_budget:
+                continue
+            picked.append(key)
+            used += cost
+            if len(picked) >= k:
+                break
+        return picked
@@ -0,0 +1,154 @@
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+# Seconds; covers everything from a cached prompt segment to a slow cold Ollama load.
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+PREFIX = "strokegpt_"
+
+_registry = {}
+_registry_lock = threading.Lock()
+_gauge_callbacks = []
+_current_trace = contextvars.ContextVar("turn_trace", default=None)
+
+def _label_key(label_names, labels):
+    return tuple(str(labels.get(name, "")) for name in label_names)
+
+def _format_labels(label_names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(label_names, values)] + list(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+class Histogram:
+    def __init__(self, name, help_text, label_names=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets)
+        self.trace_name = name.removeprefix(PREFIX).removesuffix("_seconds")
+        self._series = {}  # label values -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, seconds, **labels):
+        key = _label_key(self.label_names, labels)
+        with self._lock:
+            series = self._series.setdefault(key, [0] * len(self.buckets) + [0.0, 0])
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    series[i] += 1
+            series[-2] += seconds
+            series[-1] += 1
+        if trace := _current_trace.get():
+            trace.add(self.trace_name, seconds, labels)
+
+    @contextmanager
+    def time(self, **labels):
+        """Times the block into this histogram, and into the current turn's trace if there is one."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {key: list(values) for key, values in self._series.items()}
+        for key, values in sorted(series.items()):
+            for bound, count in zip(self.buckets, values):
+                le = 'le="%s"' % bound
+                lines.append(f"{self.name}_bucket{_format_labels(self.label_names, key, [le])} {count}")
+            le = 'le="+Inf"'
+            lines.append(f"{self.name}_bucket{_format_labels(self.label_names, key, [le])} {values[-1]}")
+            lines.append(f"{self.name}_sum{_format_labels(self.label_names, key)} {values[-2]:.6f}")
+            lines.append(f"{self.name}_count{_format_labels(self.label_names, key)} {values[-1]}")
+        return lines
+
+class Counter:
+    def __init__(self, name, help_text, label_names=()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(self.label_names, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = dict(self._values)
+        for key, value in sorted(values.items()):
+            lines.append(f"{self.name}{_format_labels(self.label_names, key)} {value}")
+        return lines
+
+def _register(cls, name, *args):
+    with _registry_lock:
+        if name not in _registry:
+            _registry[name] = cls(name, *args)
+        return _registry[name]
+
+def histogram(name, help_text, label_names=(), buckets=DEFAULT_BUCKETS):
+    return _register(Histogram, PREFIX + name, help_text, label_names, buckets)
+
+def counter(name, help_text, label_names=()):
+    return _register(Counter, PREFIX + name, help_text, label_names)
+
+def gauge_callback(name, help_text, collect):
+    """`collect()` is called on every scrape and returns a list of (labels dict, value)."""
+    _gauge_callbacks.append((PREFIX + name, help_text, collect))
+
+def render_prometheus():
+    lines = []
+    with _registry_lock:
+        metrics = list(_registry.values())
+    for metric in sorted(metrics, key=lambda m: m.name):
+        lines.extend(metric.render())
+    for name, help_text, collect in _gauge_callbacks:
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} gauge"]
+        for labels, value in collect():
+            lines.append(f"{name}{_format_labels(list(labels), list(labels.values()))} {value}")
+    return "\n".join(lines) + "\n"
+
+class TurnTrace:
+    """Everything timed during one chat turn or mode move, logged as a single line at the end."""
+    def __init__(self, kind):
+        self.kind = kind
+        self.started = time.perf_counter()
+        self.spans = []
+        self.notes = []
+        self._lock = threading.Lock()
+
+    def add(self, name, seconds, labels=None):
+        detail = ",".join(str(v) for v in (labels or {}).values() if v not in ("", None))
+        with self._lock:
+            self.spans.append(f"{name}{f'[{detail}]' if detail else ''} {seconds * 1000:.0f}ms")
+
+    def note(self, text):
+        with self._lock:
+            self.notes.append(text)
+
+    def summary(self):
+        total_ms = (time.perf_counter() - self.started) * 1000
+        with self._lock:
+            parts = self.spans + self.notes
+        return f"🧭 {self.kind} turn {total_ms:.0f}ms: " + " | ".join(parts)
+
+@contextmanager
+def trace_turn(kind):
+    trace = TurnTrace(kind)
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+        print(trace.summary())
+
+def current_trace():
+    return _current_trace.get()
@@ -0,0 +1,67 @@
+import threading
+import time
+from collections import deque
+
+def _ease(t):
+    return t * t * (3 - 2 * t)
+
+def plan_ramp(start, target, tick_s, max_duration_s=1.5, slide_pct_per_s=120.0, velocity_pct_per_s=60.0):
+    """
+    Every tick's (slide_min, slide_max, velocity) on the way from `start` to `target`, worked out in one go.
+    The ramp is long enough that neither slide edge moves faster than `slide_pct_per_s` and the velocity doesn't
+    change faster than `velocity_pct_per_s`, but never longer than `max_duration_s`. Eased at both ends.
+    """
+    rates = (slide_pct_per_s, slide_pct_per_s, velocity_pct_per_s)
+    duration_s = min(max_duration_s, max(abs(b - a) / rate for a, b, rate in zip(start, target, rates)))
+    steps = max(1, round(duration_s / tick_s))
+    return [tuple(round(a + (b - a) * _ease(i / steps)) for a, b in zip(start, target)) for i in range(1, steps + 1)]
+
+class MotionEngine:
+    """
+    Plays transition ramps at a fixed tick rate so a big change of speed or depth glides instead of jumping.
+    Each tick hands at most one state to `send_state`, which only sends what actually changed, so the number of
+    API calls is capped by the tick rate no matter how long or fine the ramp is. A new ramp replaces the old one
+    mid-way; it's planned from wherever the device was last told to be.
+    """
+    def __init__(self, send_state, tick_hz=5.0):
+        self.send_state = send_state
+        self.tick_s = 1.0 / tick_hz
+        self._ramp = deque()
+        self._cond = threading.Condition()
+        self._thread = None
+
+    @property
+    def active(self):
+        return bool(self._ramp)
+
+    def ramp_to(self, start, target):
+        ramp = plan_ramp(start, target, self.tick_s)
+        with self._cond:
+            self._ramp = deque(ramp)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="motion-engine", daemon=True)
+                self._thread.start()
+            self._cond.notify_all()
+
+    def cancel(self):
+        with self._cond:
+            self._ramp.clear()
+
+    def _run(self):
+        next_tick = time.monotonic()
+        while True:
+            with self._cond:
+                while not self._ramp:
+                    self._cond.wait()
+                    # Coming back from idle, the first step goes out straight away.
+                    next_tick = max(next_tick, time.monotonic())
+                state = self._ramp.popleft()
+            try:
+                self.send_state(state)
+            except Exception as e:
+                print(f"⚠️ Motion engine step failed: {e}")
+            next_tick += self.tick_s
+            if (delay := next_tick - time.monotonic()) > 0:
+                time.sleep(delay)
+            else:
+                next_tick = time.monotonic()
@@ -0,0 +1,48 @@
+import hashlib
+
+# Roughly how fast the Handy strokes at 100% HAMP velocity. Only used to turn a move's speed into stroke timing.
+FULL_SPEED_MM_PER_SEC = 400.0
+# The Handy can't follow points closer together than this.
+MIN_POINT_GAP_MS = 60
+
+class MotionScript:
+    """
+    A timed list of positions (0-100, in the same terms as the Handy's slide setting) in the funscript style,
+    for the Handy's HSSP mode: the device downloads the whole thing once and plays it against its own clock,
+    instead of getting a handful of HAMP commands per move.
+    """
+    def __init__(self, travel_mm=110.0):
+        self.travel_mm = travel_mm
+        self.actions = []  # (at_ms, pos)
+
+    @property
+    def duration_ms(self):
+        return self.actions[-1][0] if self.actions else 0
+
+    def __len__(self):
+        return len(self.actions)
+
+    def add_strokes(self, low, high, velocity_pct, duration_ms):
+        """Strokes between `low` and `high` for `duration_ms`, picking up smoothly from wherever the last move ended."""
+        start = self.duration_ms
+        stroke_mm = abs(high - low) / 100.0 * self.travel_mm
+        mm_per_sec = max(1.0, FULL_SPEED_MM_PER_SEC * velocity_pct / 100.0)
+        # A whole number of half strokes, stretched slightly to fit, so every move ends exactly on time.
+        half_strokes = max(1, round(duration_ms / max(MIN_POINT_GAP_MS, stroke_mm / mm_per_sec * 1000)))
+        if not self.actions:
+            self.actions.append((0, high))
+        # Head for whichever end is further away, so a new range doesn't start with a tiny twitch.
+        pos = self.actions[-1][1]
+        target = low if abs(pos - low) >= abs(pos - high) else high
+        for i in range(1, half_strokes + 1):
+            self.actions.append((start + round(duration_ms * i / half_strokes), target))
+            target = high if target == low else low
+
+    def to_csv(self):
+        return "".join(f"{at},{pos}\n" for at, pos in self.actions).encode()
+
+    def to_funscript(self):
+        return {"version": "1.0", "inverted": False, "range": 100, "actions": [{"at": at, "pos": pos} for at, pos in self.actions]}
+
+    def sha256(self):
+        return hashlib.sha256(self.to_csv()).hexdigest()
@@ -0,0 +1,100 @@
+import bisect
+import random
+import threading
+
+class PatternStore:
+    """
+    The liked-moves library, kept in settings.patterns but indexed by name, by mood and by score,
+    so liking a move, finding the top ones or picking one for a mood never scans or re-sorts the whole list.
+    Liking a move that's already in the library (or one close enough to it) bumps its score instead of adding a copy.
+    """
+    SIMILAR_WITHIN = 5
+
+    def __init__(self, settings):
+        self.settings = settings
+        self._lock = threading.Lock()
+        self._by_name = {}
+        self._by_mood = {}
+        self._ranked = []  # (-score, insertion order, name), best first
+        self._rank_keys = {}
+        self._order = 0
+        self._deduped = False
+        for pattern in list(settings.patterns):
+            self._index(pattern)
+        if self._deduped:
+            settings.patterns = list(self._by_name.values())
+
+    def _index(self, pattern):
+        name = pattern.get("name")
+        if not name:
+            return
+        if name in self._by_name:
+            # Older versions could end up with duplicate names; fold them into one.
+            self._deduped = True
+            self._bump(self._by_name[name], pattern.get("score", 1), pattern.get("moods", []))
+            return
+        self._by_name[name] = pattern
+        for mood in pattern.get("moods", []):
+            self._by_mood.setdefault(mood, []).append(name)
+        self._order += 1
+        self._set_rank(name, pattern.get("score", 0), self._order)
+
+    def _set_rank(self, name, score, order):
+        key = (-score, order, name)
+        bisect.insort(self._ranked, key)
+        self._rank_keys[name] = key
+
+    def _bump(self, pattern, by=1, moods=()):
+        name = pattern["name"]
+        old_key = self._rank_keys[name]
+        del self._ranked[bisect.bisect_left(self._ranked, old_key)]
+        pattern["score"] = pattern.get("score", 0) + by
+        for mood in moods:
+            if mood not in pattern.setdefault("moods", []):
+                pattern["moods"].append(mood)
+                self._by_mood.setdefault(mood, []).append(name)
+        self._set_rank(name, pattern["score"], old_key[1])
+
+    def __len__(self):
+        return len(self._by_name)
+
+    def find_similar(self, speed, depth):
+        """A saved pattern whose ranges sit within a few percent of this move, if any."""
+        with self._lock:
+            for pattern in self._by_name.values():
+                sp_lo, sp_hi = pattern.get("sp_range", [0, 100])
+                dp_lo, dp_hi = pattern.get("dp_range", [0, 100])
+                if abs((sp_lo + sp_hi) / 2 - speed) <= self.SIMILAR_WITHIN and abs((dp_lo + dp_hi) / 2 - depth) <= self.SIMILAR_WITHIN:
+                    return pattern
+        return None
+
+    def like(self, pattern):
+        """Adds a liked pattern, or bumps the score of the one already saved under that name."""
+        with self._lock:
+            if existing := self._by_name.get(pattern["name"]):
+                self._bump(existing, 1, pattern.get("moods", []))
+            else:
+                self._index(pattern)
+                self.settings.patterns.append(pattern)
+        self.settings.touch("patterns")
+        self.settings.save()
+
+    def bump(self, pattern, mood=None):
+        with self._lock:
+            self._bump(pattern, 1, [mood] if mood else [])
+        self.settings.touch("patterns")
+        self.settings.save()
+
+    def top(self, n=5):
+        with self._lock:
+            return [self._by_name[name] for _, _, name in self._ranked[:n]]
+
+    def pick(self, mood=None, rng=random):
+        """Picks a pattern at random, weighted by score, from the ones saved for this mood (or all of them)."""
+        with self._lock:
+            names = self._by_mood.get(mood) or list(self._by_name)
+            if not names:
+                return None
+            candidates = [self._by_name[name] for name in names]
+            weights = [max(1, p.get("score", 1)) for p in candidates]
+        return rng.choices(candidates, weights=weights)[0]
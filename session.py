@@ -0,0 +1,320 @@
+import re
+import threading
+import time
+import uuid
+from collections import deque
+from pathlib import Path
+
+from settings_manager import SettingsManager
+from handy_controller import HandyController
+from audio_service import AudioService
+from background_modes import AutoModeThread, MODE_END_MESSAGE, MILKING_FINALE_MESSAGE, NO_PATTERNS_MESSAGE
+from event_stream import EventBroadcaster
+from memory_consolidator import MemoryConsolidator
+from memory_index import MemoryIndex
+from pattern_store import PatternStore
+from context_window import ContextWindow
+from telemetry import PositionSampler
+from warmup import Readiness
+
+# Lines the app says over and over, pre-generated into the TTS cache once a voice is picked.
+STOP_MESSAGE = "Stopping."
+AUTO_INTRO = "Okay, I'll take over..."
+EDGING_INTRO = "Let's play an edging game..."
+MILKING_INTRO = "You're so close... I'm taking over completely now."
+PLAYBACK_INTRO = "Let me play your favorites..."
+FIXED_PHRASES = [STOP_MESSAGE, AUTO_INTRO, EDGING_INTRO, MILKING_INTRO, PLAYBACK_INTRO, MODE_END_MESSAGE, MILKING_FINALE_MESSAGE, NO_PATTERNS_MESSAGE]
+
+class Session:
+    """Everything one browser and its Handy need: settings, device, voice, chat history and the running mode."""
+    def __init__(self, session_id, settings_path, llm, tts_cache=None, shared_readiness=None):
+        self.session_id = session_id
+        self.llm = llm
+        self.settings = SettingsManager(settings_file_path=settings_path)
+        self.settings.load()
+        self.patterns = PatternStore(self.settings)
+
+        self.handy = HandyController(self.settings.handy_key)
+        self.handy.update_settings(self.settings.min_speed, self.settings.max_speed, self.settings.min_depth, self.settings.max_depth)
+        self.handy.smooth_transitions = self.settings.smooth_transitions
+
+        self.audio = AudioService(cache=tts_cache, prewarm_phrases=FIXED_PHRASES)
+        self.events = EventBroadcaster()
+        # Ollama warms up once for everyone (shared_readiness); the voice is per session and starts in the background.
+        self.shared_readiness = shared_readiness or Readiness()
+        self.readiness = Readiness()
+        self.readiness.on_change = self.publish_readiness
+        if self.settings.elevenlabs_api_key:
+            self.readiness.run("voice", self._start_voice)
+
+        # In-Memory State
+        self.chat_history = ContextWindow(llm, budget_tokens=llm.history_token_budget, cancel_group=f"{session_id}:summary")
+        self.messages_for_ui = deque(maxlen=100)  # only used when no browser is listening on /events
+        self.auto_mode_active_task = None
+        self.current_mood = "Curious"
+        self.use_long_term_memory = True
+        self.calibration_pos_mm = 0.0
+        self.user_signal_event = threading.Event()
+        self.mode_message_queue = deque(maxlen=5)
+        self.edging_start_time = None
+        self.last_seen = time.time()
+
+        # Easter Egg State
+        self.special_persona_mode = None
+        self.special_persona_interactions_left = 0
+
+        self.memory = MemoryConsolidator(llm, self.settings, cancel_group=f"{session_id}:memory")
+        self.memory.start()
+        self.memory_index = MemoryIndex()
+        self.prompt_segments = {}  # the LLM's cached system prompt pieces for this session's settings
+        self._memory_index_version = None
+
+        self.telemetry = PositionSampler(self.handy)
+        self.telemetry.on_stats = self.publish_status
+        if self.settings.position_telemetry:
+            self.telemetry.start()
+
+        self.handy.on_state_change = self.publish_status
+        self.audio.on_audio_ready = lambda clip_id: self.events.publish("audio", {"id": clip_id})
+
+    def _start_voice(self):
+        if not self.audio.set_api_key(self.settings.elevenlabs_api_key):
+            raise RuntimeError("Couldn't set up the ElevenLabs client.")
+        if (result := self.audio.fetch_available_voices())["status"] != "success":
+            raise RuntimeError(result["message"])
+        if self.settings.elevenlabs_voice_id:
+            self.audio.configure_voice(self.settings.elevenlabs_voice_id, True)
+        return f"{len(self.audio.available_voices)} voices"
+
+    def get_readiness(self):
+        # "ready" means nothing is still warming up; anything that failed says why in its note.
+        services = {**self.shared_readiness.snapshot(), **self.readiness.snapshot()}
+        return {"ready": all(entry["state"] != "warming" for entry in services.values()), "services": services}
+
+    def publish_readiness(self):
+        self.events.publish("readiness", self.get_readiness())
+
+    def get_current_context(self):
+        settings = self.settings
+        context = {
+            'persona_desc': settings.persona_desc, 'current_mood': self.current_mood,
+            'user_memories': self.relevant_memories(), 'patterns': self.patterns.top(5),
+            'rules': settings.rules, 'last_stroke_speed': self.handy.last_relative_speed,
+            'last_depth_pos': self.handy.last_depth_pos, 'use_long_term_memory': self.use_long_term_memory,
+            'edging_elapsed_time': None, 'special_persona_mode': self.special_persona_mode,
+            'settings_version': settings.version, 'segment_cache': self.prompt_segments, 'conversation_summary': self.chat_history.summary,
+            'measured_motion': self.telemetry.stats()
+        }
+        if self.edging_start_time:
+            elapsed_seconds = int(time.time() - self.edging_start_time)
+            minutes, seconds = divmod(elapsed_seconds, 60)
+            hours, minutes = divmod(minutes, 60)
+            if hours > 0:
+                context['edging_elapsed_time'] = f"{hours}h {minutes}m {seconds}s"
+            else:
+                context['edging_elapsed_time'] = f"{minutes}m {seconds}s"
+        return context
+
+    def relevant_memories(self, k=8, token_budget=200):
+        """The user's name plus the top-k memories that matter for the latest message and the running mode."""
+        settings = self.settings
+        profile = settings.user_profile
+        if self._memory_index_version != settings.version:
+            self.memory_index.sync(profile)
+            self._memory_index_version = settings.version
+        last_user_message = next((turn["content"] for turn in reversed(self.chat_history) if turn["role"] == "user"), "")
+        query = last_user_message
+        if task := self.auto_mode_active_task:
+            query += f" {task.name}"
+        memories = {"name": profile.get("name")}
+        for field, text in self.memory_index.search(query, k=k, token_budget=token_budget):
+            memories.setdefault(field, []).append(text)
+        return memories
+
+    def get_status(self):
+        effective_in_ms = max(0, round((self.handy.last_effective_at - time.time()) * 1000))
+        return {"mood": self.current_mood, "speed": self.handy.last_stroke_speed, "depth": self.handy.last_depth_pos,
+                "effective_in_ms": effective_in_ms, "measured": self.telemetry.stats()}
+
+    def set_position_telemetry(self, enabled):
+        self.settings.position_telemetry = enabled
+        self.settings.save()
+        if enabled:
+            self.telemetry.start()
+        else:
+            self.telemetry.stop()
+
+    def set_smooth_transitions(self, enabled):
+        self.settings.smooth_transitions = enabled
+        self.settings.save()
+        self.handy.smooth_transitions = enabled
+
+    def current_position_mm(self):
+        """The latest telemetry sample if the sampler is running, otherwise a direct (blocking) read."""
+        if (position := self.telemetry.latest_position_mm()) is not None:
+            return position
+        return self.handy.get_position_mm()
+
+    def publish_status(self, *_):
+        self.events.publish("status", self.get_status())
+
+    def set_mood(self, mood):
+        self.current_mood = mood
+        self.publish_status()
+
+    def add_message_to_queue(self, text, add_to_history=True):
+        if self.events.has_subscribers():
+            self.events.publish("chat", {"text": text})
+        else:
+            self.messages_for_ui.append(text)
+        if add_to_history:
+            clean_text = re.sub(r'<[^>]+>', '', text).strip()
+            if clean_text: self.add_to_history("assistant", clean_text)
+        self.audio.queue_text(text)
+
+    def add_to_history(self, role, content):
+        self.chat_history.append({"role": role, "content": content})
+        self.memory.record(role, content)
+
+    def start_background_mode(self, mode_logic, initial_message, mode_name):
+        if self.auto_mode_active_task:
+            self.auto_mode_active_task.stop()
+            self.auto_mode_active_task.join(timeout=5)
+
+        self.user_signal_event.clear()
+        self.mode_message_queue.clear()
+        if mode_name == 'edging':
+            self.edging_start_time = time.time()
+
+        def on_stop():
+            self.auto_mode_active_task = None
+            self.edging_start_time = None
+
+        def get_timings(n):
+            settings = self.settings
+            return {
+                'auto': (settings.auto_min_time, settings.auto_max_time),
+                'milking': (settings.milking_min_time, settings.milking_max_time),
+                'edging': (settings.edging_min_time, settings.edging_max_time)
+            }.get(n, (3, 5))
+
+        services = {'llm': self.llm, 'handy': self.handy, 'patterns': self.patterns, 'cancel_group': self.mode_cancel_group}
+        callbacks = {
+            'send_message': self.add_message_to_queue, 'get_context': self.get_current_context, 'get_mood': lambda: self.current_mood,
+            'get_timings': get_timings, 'on_stop': on_stop, 'update_mood': self.set_mood,
+            'user_signal_event': self.user_signal_event,
+            'message_queue': self.mode_message_queue
+        }
+        self.auto_mode_active_task = AutoModeThread(mode_logic, initial_message, services, callbacks, mode_name=mode_name)
+        self.auto_mode_active_task.start()
+
+    @property
+    def mode_cancel_group(self):
+        return f"{self.session_id}:mode"
+
+    def cancel_pending_requests(self):
+        # Drops any LLM reply still being generated for this session, from chat or from a mode.
+        runtime = self.llm.runtime
+        runtime.cancel_group(self.session_id)
+        runtime.cancel_group(self.mode_cancel_group)
+
+    def stop_background_mode(self):
+        if task := self.auto_mode_active_task:
+            task.stop()
+            self.llm.runtime.cancel_group(self.mode_cancel_group)
+
+    def is_busy(self):
+        """A mode is running or a browser is listening, even if it hasn't made a request in a while."""
+        return self.auto_mode_active_task is not None or self.events.has_subscribers()
+
+    def save_on_exit(self):
+        # Memory is kept up to date while the app runs; anything not consolidated yet is saved and picked up next time.
+        self.stop_background_mode()
+        self.memory.stop()
+        self.telemetry.stop()
+        self.settings.save()
+        self.settings.flush()
+
+class SessionManager:
+    """
+    Hands out one Session per browser, keyed by a random cookie value.
+    The first browser ever to show up becomes the owner and gets the 'default' session, which keeps using
+    my_settings.json; its cookie is remembered next to that file (my_settings.owner) so it survives restarts and
+    nobody else can claim it. Anyone else gets their own settings file under sessions/.
+    Other sessions left idle for IDLE_EVICT_SECONDS are shut down, and their file removed if they were never set up.
+    """
+    DEFAULT_ID = "default"  # internal only; browsers never see or send it
+    IDLE_EVICT_SECONDS = 60 * 60
+    EVICT_CHECK_SECONDS = 60
+    _VALID_ID = re.compile(r"^[0-9a-f]{32}$")
+
+    def __init__(self, llm, default_settings_path="my_settings.json", sessions_dir="sessions", tts_cache=None, readiness=None):
+        self.llm = llm
+        self.default_settings_path = default_settings_path
+        self.sessions_dir = Path(sessions_dir)
+        self.tts_cache = tts_cache
+        self.readiness = readiness
+        self._sessions = {}
+        self._owner_path = Path(default_settings_path).with_suffix(".owner")
+        self._owner_id = self._owner_path.read_text().strip() if self._owner_path.exists() else None
+        self._last_evict_check = time.time()
+        self._lock = threading.Lock()
+
+    def _settings_path(self, session_id):
+        if session_id == self.DEFAULT_ID:
+            return self.default_settings_path
+        self.sessions_dir.mkdir(parents=True, exist_ok=True)
+        return self.sessions_dir / f"{session_id}.json"
+
+    def resolve(self, session_id):
+        """Returns (session, new_session_id). new_session_id is set when the caller needs to hand out a cookie."""
+        new_id = None
+        with self._lock:
+            if not session_id or not self._VALID_ID.match(session_id):
+                session_id = new_id = uuid.uuid4().hex
+                if self._owner_id is None:
+                    self._claim_owner(session_id)
+            session = self._get_or_create(self.DEFAULT_ID if session_id == self._owner_id else session_id)
+            now = session.last_seen = time.time()
+            evict_due = now - self._last_evict_check >= self.EVICT_CHECK_SECONDS
+            if evict_due:
+                self._last_evict_check = now
+        if evict_due:
+            threading.Thread(target=self.evict_idle, name="session-evict", daemon=True).start()
+        return session, new_id
+
+    def evict_idle(self, max_idle_s=None):
+        """Shuts down sessions nobody has used for `max_idle_s`, apart from the default one and any that are busy."""
+        cutoff = time.time() - (max_idle_s or self.IDLE_EVICT_SECONDS)
+        with self._lock:
+            idle = [session for session_id, session in self._sessions.items()
+                    if session_id != self.DEFAULT_ID and session.last_seen < cutoff and not session.is_busy()]
+            for session in idle:
+                del self._sessions[session.session_id]
+        for session in idle:
+            session.save_on_exit()
+            if not session.settings.handy_key:
+                session.settings.file_path.unlink(missing_ok=True)
+        if idle:
+            print(f"🧹 Closed {len(idle)} idle session(s).")
+        return len(idle)
+
+    def _claim_owner(self, session_id):
+        self._owner_id = session_id
+        SettingsManager._write_atomic(self._owner_path, session_id)
+
+    def _get_or_create(self, session_id):
+        session = self._sessions.get(session_id)
+        if session is None:
+            session = Session(session_id, self._settings_path(session_id), self.llm, self.tts_cache, self.readiness)
+            self._sessions[session_id] = session
+        return session
+
+    def start_default(self):
+        """Sets up the default session before any browser asks for it, so its voice is already warming by then."""
+        with self._lock:
+            self._get_or_create(self.DEFAULT_ID)
+
+    def all_sessions(self):
+        with self._lock:
+            return list(self._sessions.values())
@@ -1,9 +1,24 @@
 import json
+import os
 from pathlib import Path
 import threading
 
 class SettingsManager:
-    def __init__(self, settings_file_path):
+    """
+    Changes are written behind: save() only marks the settings for writing, and a timer writes them
+    once things have been quiet for `save_delay` seconds. Call flush() to write right now.
+    """
+    # Big blobs live in their own file next to the settings, so a slider drag doesn't rewrite them.
+    BLOB_FIELDS = {"profile_picture_b64": ".pfp"}
+    # Saved, but nothing the prompt is built from, so changing them doesn't bump the version.
+    BOOKKEEPING_FIELDS = {"pending_memory_turns"}
+
+    def __init__(self, settings_file_path, save_delay=1.0):
+        self._version = 0
+        self._dirty = set()
+        self._dirty_lock = threading.Lock()
+        self._save_timer = None
+        self._save_delay = save_delay
         self.file_path = Path(settings_file_path)
         self._save_lock = threading.Lock()
 
@@ -16,7 +31,7 @@ class SettingsManager:
         self.milking_patterns = []
         self.rules = []
         self.user_profile = self._get_default_profile()
-        self.session_liked_patterns = []
+        self.pending_memory_turns = []
         self.elevenlabs_api_key = ""
         self.elevenlabs_voice_id = ""
         self.min_depth = 5
@@ -29,6 +44,29 @@ class SettingsManager:
         self.milking_max_time = 4.5
         self.edging_min_time = 5.0
         self.edging_max_time = 8.0
+        self.position_telemetry = False
+        self.smooth_transitions = True
+
+    def __setattr__(self, name, value):
+        super().__setattr__(name, value)
+        if not name.startswith('_'):
+            self.touch(name)
+
+    @property
+    def version(self):
+        """Goes up on every settings change, so anything derived from the settings knows when to rebuild."""
+        return self._version
+
+    def touch(self, *fields):
+        """Call after changing a list or dict in place, which assignment tracking can't see."""
+        if not fields or set(fields) - self.BOOKKEEPING_FIELDS:
+            self._version += 1
+        if fields:
+            with self._dirty_lock:
+                self._dirty |= set(fields)
+
+    def _blob_path(self, field):
+        return self.file_path.with_suffix(self.BLOB_FIELDS[field])
 
     def _get_default_profile(self):
         return {"name": "Unknown", "likes": [], "dislikes": [], "key_memories": []}
@@ -36,7 +74,7 @@ class SettingsManager:
     def load(self):
         if not self.file_path.exists():
             print("ℹ️ No settings file found, creating one with default values.")
-            self.save()
+            self.flush()
             return
 
         try:
@@ -44,11 +82,13 @@ class SettingsManager:
             self.handy_key = data.get("handy_key", "")
             self.ai_name = data.get("ai_name", "BOT") # Load name
             self.persona_desc = data.get("persona_desc", "An energetic and passionate girlfriend")
-            self.profile_picture_b64 = data.get("profile_picture_b64", "")
+            blob_path = self._blob_path("profile_picture_b64")
+            self.profile_picture_b64 = blob_path.read_text() if blob_path.exists() else data.get("profile_picture_b64", "")
             self.patterns = data.get("patterns", [])
             self.milking_patterns = data.get("milking_patterns", [])
             self.rules = data.get("rules", [])
             self.user_profile = data.get("user_profile", self._get_default_profile())
+            self.pending_memory_turns = data.get("pending_memory_turns", [])
             self.elevenlabs_api_key = data.get("elevenlabs_api_key", "")
             self.elevenlabs_voice_id = data.get("elevenlabs_voice_id", "")
             self.min_depth = data.get("min_depth", 5)
@@ -61,36 +101,68 @@ class SettingsManager:
             self.milking_max_time = data.get("milking_max_time", 4.5)
             self.edging_min_time = data.get("edging_min_time", 5.0)
             self.edging_max_time = data.get("edging_max_time", 8.0)
-            print("✅ Loaded settings from my_settings.json")
+            self.position_telemetry = data.get("position_telemetry", False)
+            self.smooth_transitions = data.get("smooth_transitions", True)
+            with self._dirty_lock:
+                # Older settings files kept the picture inline; the next write moves it out.
+                self._dirty = set(self.BLOB_FIELDS.keys() & data.keys())
+                if self._dirty: self._dirty.add("persona_desc")
+            print(f"✅ Loaded settings from {self.file_path.name}")
         except Exception as e:
             print(f"⚠️ Couldn't read settings file, using defaults. Error: {e}")
 
-    def save(self, llm_service=None, chat_history_to_save=None):
+    def save(self):
+        """Marks the settings for writing."""
+        with self._dirty_lock:
+            if self._save_timer:
+                self._save_timer.cancel()
+            self._save_timer = threading.Timer(self._save_delay, self.flush)
+            self._save_timer.daemon = True
+            self._save_timer.start()
+
+    def flush(self):
+        """Writes whatever changed since the last write. Safe to call from any thread."""
         with self._save_lock:
-            if llm_service and chat_history_to_save:
-                self.user_profile = llm_service.consolidate_user_profile(
-                    list(chat_history_to_save), self.user_profile
-                )
-            
-            if self.session_liked_patterns:
-                print(f"🧠 Saving {len(self.session_liked_patterns)} liked patterns...")
-                for new_pattern in self.session_liked_patterns:
-                    if not any(p["name"] == new_pattern["name"] for p in self.patterns):
-                        self.patterns.append(new_pattern)
-                self.session_liked_patterns.clear()
+            with self._dirty_lock:
+                if self._save_timer:
+                    self._save_timer.cancel()
+                    self._save_timer = None
+                dirty, self._dirty = self._dirty, set()
+            if not dirty and self.file_path.exists():
+                return
+            try:
+                for field in self.BLOB_FIELDS.keys() & dirty:
+                    if value := getattr(self, field):
+                        self._write_atomic(self._blob_path(field), value)
+                    else:
+                        self._blob_path(field).unlink(missing_ok=True)
+                if dirty - self.BLOB_FIELDS.keys() or not self.file_path.exists():
+                    self._write_atomic(self.file_path, json.dumps(self._settings_dict(), indent=2))
+            except OSError as e:
+                print(f"⚠️ Couldn't save settings: {e}")
+                with self._dirty_lock:
+                    self._dirty |= dirty
+
+    def _settings_dict(self):
+        return {
+            "handy_key": self.handy_key,
+            "ai_name": self.ai_name, # Save name
+            "persona_desc": self.persona_desc,
+            "elevenlabs_api_key": self.elevenlabs_api_key, "elevenlabs_voice_id": self.elevenlabs_voice_id,
+            "patterns": self.patterns, "milking_patterns": self.milking_patterns,
+            "rules": self.rules, "user_profile": self.user_profile,
+            "pending_memory_turns": self.pending_memory_turns,
+            "min_depth": self.min_depth, "max_depth": self.max_depth,
+            "min_speed": self.min_speed, "max_speed": self.max_speed,
+            "auto_min_time": self.auto_min_time, "auto_max_time": self.auto_max_time,
+            "milking_min_time": self.milking_min_time, "milking_max_time": self.milking_max_time,
+            "edging_min_time": self.edging_min_time, "edging_max_time": self.edging_max_time,
+            "position_telemetry": self.position_telemetry, "smooth_transitions": self.smooth_transitions,
+        }
 
-            settings_dict = {
-                "handy_key": self.handy_key,
-                "ai_name": self.ai_name, # Save name
-                "persona_desc": self.persona_desc,
-                "profile_picture_b64": self.profile_picture_b64,
-                "elevenlabs_api_key": self.elevenlabs_api_key, "elevenlabs_voice_id": self.elevenlabs_voice_id,
-                "patterns": self.patterns, "milking_patterns": self.milking_patterns,
-                "rules": self.rules, "user_profile": self.user_profile,
-                "min_depth": self.min_depth, "max_depth": self.max_depth,
-                "min_speed": self.min_speed, "max_speed": self.max_speed,
-                "auto_min_time": self.auto_min_time, "auto_max_time": self.auto_max_time,
-                "milking_min_time": self.milking_min_time, "milking_max_time": self.milking_max_time,
-                "edging_min_time": self.edging_min_time, "edging_max_time": self.edging_max_time,
-            }
-            self.file_path.write_text(json.dumps(settings_dict, indent=2))
\ No newline at end of file
+    @staticmethod
+    def _write_atomic(path, text):
+        # Written to a temp file and swapped in, so a crash mid-write can't leave a half-written settings file.
+        tmp_path = path.with_name(path.name + ".tmp")
+        tmp_path.write_text(text)
+        os.replace(tmp_path, path)
@@ -0,0 +1,124 @@
+import operator
+import threading
+import time
+from array import array
+from bisect import bisect_left
+
+# Position changes smaller than this between samples are sensor noise, not a change of direction.
+NOISE_MM = 1.0
+
+class PositionRing:
+    """Fixed-size ring of (time.monotonic(), position mm) samples in two flat double arrays, so it never grows or allocates."""
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.times = array('d', bytes(8 * capacity))
+        self.positions = array('d', bytes(8 * capacity))
+        self._next = 0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self._count
+
+    def append(self, at, position_mm):
+        with self._lock:
+            self.times[self._next] = at
+            self.positions[self._next] = position_mm
+            self._next = (self._next + 1) % self.capacity
+            self._count = min(self._count + 1, self.capacity)
+
+    def latest(self):
+        with self._lock:
+            if not self._count:
+                return None
+            i = (self._next - 1) % self.capacity
+            return self.times[i], self.positions[i]
+
+    def window(self, seconds, now=None):
+        """The samples from the last `seconds`, oldest first, as (times, positions) arrays."""
+        with self._lock:
+            start = (self._next - self._count) % self.capacity
+            if start + self._count <= self.capacity:
+                times = self.times[start:start + self._count]
+                positions = self.positions[start:start + self._count]
+            else:
+                times = self.times[start:] + self.times[:self._next]
+                positions = self.positions[start:] + self.positions[:self._next]
+        cutoff = bisect_left(times, (time.monotonic() if now is None else now) - seconds)
+        return times[cutoff:], positions[cutoff:]
+
+def motion_stats(times, positions, travel_mm):
+    """
+    Stroke rate and depth range from a run of samples. Works on whole arrays at a time (map/min/max run in C)
+    rather than stepping through samples in Python, so it stays cheap at any sample rate.
+    """
+    if len(times) < 3 or times[-1] <= times[0]:
+        return None
+    span_s = times[-1] - times[0]
+    deltas = array('d', map(operator.sub, positions[1:], positions[:-1]))
+    directions = [delta > 0 for delta in deltas if abs(delta) >= NOISE_MM]
+    reversals = sum(map(operator.ne, directions[1:], directions[:-1]))
+    return {
+        # Two reversals make one full stroke.
+        "strokes_per_min": round(reversals / 2 / span_s * 60, 1),
+        "depth_min_pct": round(min(positions) / travel_mm * 100),
+        "depth_max_pct": round(max(positions) / travel_mm * 100),
+        "avg_speed_mm_s": round(sum(map(abs, deltas)) / span_s, 1),
+        "samples": len(times),
+    }
+
+class PositionSampler:
+    """
+    Opt-in background reader of where the Handy's slider actually is, rather than where it was last told to go.
+    Polls at `rate_hz` into a PositionRing holding `history_s` seconds. Anything that needs the position
+    (stats for the prompt and the status push, calibration) reads the latest sample instead of asking the device.
+    Note the stroke rate it can see tops out at about rate_hz * 30 strokes a minute.
+    """
+    def __init__(self, handy_controller, rate_hz=5.0, history_s=30.0, stats_window_s=5.0):
+        self.handy = handy_controller
+        self.rate_hz = rate_hz
+        self.stats_window_s = stats_window_s
+        self.ring = PositionRing(int(rate_hz * history_s))
+        self.on_stats = None
+        self._thread = None
+        self._stop_event = threading.Event()
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive() and not self._stop_event.is_set()
+
+    def start(self):
+        if self.running:
+            return
+        # A thread still winding down from stop() keeps its own (set) stop event; the new one gets a fresh one.
+        self._stop_event = threading.Event()
+        self._thread = threading.Thread(target=self._run, args=(self._stop_event,), name="position-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def _run(self, stop_event):
+        interval = 1.0 / self.rate_hz
+        next_at = time.monotonic()
+        samples_since_stats = 0
+        while not stop_event.is_set():
+            if (position := self.handy.get_position_mm()) is not None:
+                self.ring.append(time.monotonic(), position)
+                samples_since_stats += 1
+            # Stats go out about once a second, not once per sample.
+            if samples_since_stats >= self.rate_hz and self.on_stats:
+                samples_since_stats = 0
+                self.on_stats(self.stats())
+            next_at = max(next_at + interval, time.monotonic())
+            stop_event.wait(next_at - time.monotonic())
+
+    def latest_position_mm(self, max_age_s=1.0):
+        if self.running and (sample := self.ring.latest()) and time.monotonic() - sample[0] <= max_age_s:
+            return sample[1]
+        return None
+
+    def stats(self):
+        if not self.running:
+            return None
+        return motion_stats(*self.ring.window(self.stats_window_s), self.handy.FULL_TRAVEL_MM)
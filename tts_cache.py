@@ -0,0 +1,93 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+class TTSCache:
+    """
+    Size-bounded, on-disk LRU of synthesized clips. Keys cover everything that changes how a line sounds,
+    so a hit can be played back instead of paying for another ElevenLabs request.
+    """
+    def __init__(self, cache_dir, max_bytes=64 * 1024 * 1024):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> size in bytes, least recently used first
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            self._load_index()
+        except OSError as e:
+            print(f"⚠️ TTS cache unavailable: {e}")
+
+    @staticmethod
+    def normalize_text(text):
+        return " ".join(text.split())
+
+    @classmethod
+    def make_key(cls, voice_id, model_id, voice_settings, text):
+        raw = json.dumps([voice_id, model_id, voice_settings, cls.normalize_text(text)], sort_keys=True)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _path(self, key):
+        return self.cache_dir / f"{key}.mp3"
+
+    def _load_index(self):
+        # mtime is bumped on every hit, so sorting by it restores the LRU order from the last run.
+        files = sorted(self.cache_dir.glob("*.mp3"), key=lambda p: p.stat().st_mtime)
+        for path in files:
+            size = path.stat().st_size
+            self._entries[path.stem] = size
+            self._total_bytes += size
+        self._evict()
+
+    def _evict(self):
+        while self._total_bytes > self.max_bytes and self._entries:
+            key, size = self._entries.popitem(last=False)
+            self._total_bytes -= size
+            try:
+                self._path(key).unlink()
+            except OSError:
+                pass
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._entries
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        try:
+            path = self._path(key)
+            data = path.read_bytes()
+            os.utime(path)
+            return data
+        except OSError:
+            with self._lock:
+                self._total_bytes -= self._entries.pop(key, 0)
+            return None
+
+    def put(self, key, data):
+        if not data or len(data) > self.max_bytes:
+            return
+        path = self._path(key)
+        tmp_path = path.with_suffix(".tmp")
+        try:
+            tmp_path.write_bytes(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"⚠️ Couldn't write to TTS cache: {e}")
+            return
+        with self._lock:
+            self._total_bytes -= self._entries.pop(key, 0)
+            self._entries[key] = len(data)
+            self._total_bytes += len(data)
+            self._evict()
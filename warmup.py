@@ -0,0 +1,61 @@
+import threading
+import time
+import metrics
+
+WARMUP_SECONDS = metrics.histogram("warmup_seconds", "Background start-up of a service, from kick-off to ready", ("service",))
+
+class Readiness:
+    """
+    Services that start up in the background (loading the Ollama model, listing ElevenLabs voices...), so the web
+    server can answer straight away while they warm. Each one is "warming", "ready" or "failed", with a short note.
+    `on_change` hears about every change; failed ones can be tried again with retry_failed().
+    """
+    def __init__(self):
+        self._states = {}
+        self._work = {}
+        self._lock = threading.Lock()
+        self.on_change = None
+
+    def run(self, name, work):
+        """Runs `work()` on a background thread. It returns a short note for the UI (or None) and raises if it failed."""
+        with self._lock:
+            if self._states.get(name, {}).get("state") == "warming":
+                return
+            self._work[name] = work
+        self._set(name, "warming")
+        threading.Thread(target=self._warm, args=(name, work), name=f"warmup-{name}", daemon=True).start()
+
+    def _warm(self, name, work):
+        started = time.monotonic()
+        try:
+            note = work()
+        except Exception as e:
+            print(f"⚠️ {name} didn't start: {e}")
+            self._set(name, "failed", str(e))
+            return
+        WARMUP_SECONDS.observe(time.monotonic() - started, service=name)
+        print(f"✅ {name} ready in {time.monotonic() - started:.1f}s.")
+        self._set(name, "ready", note)
+
+    def _set(self, name, state, note=None):
+        with self._lock:
+            self._states[name] = {"state": state, "note": note}
+        if self.on_change:
+            self.on_change()
+
+    def retry_failed(self):
+        with self._lock:
+            failed = [(name, self._work[name]) for name, entry in self._states.items() if entry["state"] == "failed"]
+        for name, work in failed:
+            self.run(name, work)
+
+    def forget(self, name):
+        with self._lock:
+            self._states.pop(name, None)
+            self._work.pop(name, None)
+        if self.on_change:
+            self.on_change()
+
+    def snapshot(self):
+        with self._lock:
+            return {name: dict(entry) for name, entry in self._states.items()}